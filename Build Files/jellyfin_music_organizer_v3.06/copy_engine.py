@@ -0,0 +1,197 @@
+import os
+import sys
+import filecmp
+
+from io_throttle import io_throttle
+
+# Buffer size for the read/write fallback
+copy_buffer_size = 1024 * 1024
+
+def copy_with_copy_file_range(source_fd, destination_fd, size):
+    # The kernel copies the data itself and may share extents (reflink) on btrfs/XFS
+    offset = 0
+    while offset < size:
+        # The throttle hands out the whole file at once unless a bytes limit is set
+        copied = os.copy_file_range(source_fd, destination_fd, io_throttle.take_bytes(size - offset), offset, offset)
+        if copied == 0:
+            break
+        offset += copied
+    if offset < size:
+        # Some filesystems (procfs, some FUSE and network mounts) stop early, copy_file then tries the next method
+        raise OSError(f"copy_file_range stopped after {offset} of {size} bytes")
+
+def copy_with_sendfile(source_fd, destination_fd, size):
+    # The kernel moves the data between the files without copying it through Python
+    offset = 0
+    while offset < size:
+        sent = os.sendfile(destination_fd, source_fd, offset, io_throttle.take_bytes(min(size - offset, 1024 * 1024 * 1024)))
+        if sent == 0:
+            break
+        offset += sent
+    if offset < size:
+        raise OSError(f"sendfile stopped after {offset} of {size} bytes")
+
+def copy_with_buffer(source_fd, destination_fd, size):
+    # Plain read/write loop with one large reusable buffer
+    buffer = bytearray(copy_buffer_size)
+    view = memoryview(buffer)
+    with open(source_fd, 'rb', buffering=0, closefd=False) as source_file, open(destination_fd, 'wb', buffering=0, closefd=False) as destination_file:
+        while True:
+            read = source_file.readinto(buffer)
+            if not read:
+                break
+            # The buffer is never larger than the throttle's chunk, so all of it may be written
+            io_throttle.take_bytes(read)
+            destination_file.write(view[:read])
+
+# Copy methods in order of preference, skipping the ones this platform does not have
+copy_methods = [(name, method) for name, method, available in [
+    ('copy_file_range', copy_with_copy_file_range, hasattr(os, 'copy_file_range')),
+    ('sendfile', copy_with_sendfile, hasattr(os, 'sendfile')),
+    ('buffer', copy_with_buffer, True),
+] if available]
+
+def copy_file(source_path, destination_path, sync_data=False):
+    # Copy the file contents only (no chmod like shutil.copy) and return the name of the method used
+    with open(source_path, 'rb') as source_file, open(destination_path, 'wb') as destination_file:
+        source_fd = source_file.fileno()
+        destination_fd = destination_file.fileno()
+        size = os.fstat(source_fd).st_size
+
+        for name, method in copy_methods:
+            try:
+                method(source_fd, destination_fd, size)
+                break
+            except OSError:
+                # Not supported for this pair of files (e.g. across filesystems), start over with the next method
+                if name == 'buffer':
+                    raise
+                os.lseek(source_fd, 0, os.SEEK_SET)
+                os.lseek(destination_fd, 0, os.SEEK_SET)
+                os.ftruncate(destination_fd, 0)
+
+        # Flush the copy to disk before it is renamed into place
+        if sync_data:
+            os.fsync(destination_fd)
+        return name
+
+def reflink_file(source_path, destination_path, sync_data=False):
+    # Clone the file's extents with the Linux FICLONE ioctl so both files share data until one is written
+    if not sys.platform.startswith('linux'):
+        raise OSError('Reflinks are not supported on this platform')
+    import fcntl
+    with open(source_path, 'rb') as source_file, open(destination_path, 'wb') as destination_file:
+        fcntl.ioctl(destination_file.fileno(), 0x40049409, source_file.fileno())
+        if sync_data:
+            os.fsync(destination_file.fileno())
+    return 'reflink'
+
+# Link methods for each placement mode, these create the destination in one step
+link_methods = {
+    'hardlink': os.link,
+    'symlink': lambda source_path, destination_path: os.symlink(os.path.abspath(source_path), destination_path),
+}
+
+def same_device(source_path, destination_path):
+    return os.stat(source_path).st_dev == os.stat(os.path.dirname(destination_path)).st_dev
+
+def temporary_path(destination_path):
+    # Hidden name in the album folder so the rename never crosses filesystems
+    folder_path, file_name = os.path.split(destination_path)
+    return f"{folder_path}/.{file_name}.jmo-part"
+
+def write_atomically(write_method, source_path, destination_path, sync_data=False, verify=False):
+    # Write to a temporary name and rename it into place, so the destination is never seen half written
+    temp_path = temporary_path(destination_path)
+    try:
+        placement_method = write_method(source_path, temp_path, sync_data)
+        if verify and not filecmp.cmp(source_path, temp_path, shallow=False):
+            raise OSError('Copied file does not match the source, the source was kept')
+        os.replace(temp_path, destination_path)
+    except BaseException:
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+        raise
+    return placement_method
+
+def move_file(source_path, destination_path, sync_data=False):
+    if same_device(source_path, destination_path):
+        # Same device, the rename is effectively instant
+        os.replace(source_path, destination_path)
+        return 'move (rename)'
+
+    # Different devices, copy and verify before the source is removed
+    move_method = f"move ({write_atomically(copy_file, source_path, destination_path, sync_data, verify=True)})"
+    os.remove(source_path)
+    return move_method
+
+def reconcile_interrupted_placements(run_journal, unfinished_placements):
+    # Finish or undo placements that were started but never completed by an earlier run
+    for (source_path, destination_path), (placement_mode, replace) in unfinished_placements.items():
+        # A temporary file is never complete, it was not renamed into place
+        if os.path.lexists(temporary_path(destination_path)):
+            os.remove(temporary_path(destination_path))
+
+        if placement_mode == 'move' and not os.path.exists(source_path):
+            # The rename or the copy and unlink went through
+            run_journal.record('completed', source_path, destination_path)
+        elif placement_mode == 'move' and os.path.exists(destination_path) and filecmp.cmp(source_path, destination_path, shallow=False):
+            # The copy was verified but the source was never removed
+            os.remove(source_path)
+            run_journal.record('completed', source_path, destination_path)
+        else:
+            # Copies, reflinks and moves are renamed into place whole, so a file at the destination name is either the
+            # finished song or the file a replacement was going to overwrite, and both are left for the identity check.
+            # Only a link that was new to the destination is removed, so the song is placed again
+            if placement_mode in link_methods and not replace and os.path.lexists(destination_path):
+                os.remove(destination_path)
+            run_journal.record('rolled back', source_path, destination_path)
+    return len(unfinished_placements)
+
+def make_placement(source_path, destination_path, placement_mode, sync_data=False):
+    # Moves relocate the source instead of leaving it behind
+    if placement_mode == 'move':
+        return move_file(source_path, destination_path, sync_data)
+
+    # Links are only made when the source and destination folder are on the same device
+    if placement_mode == 'reflink' or placement_mode in link_methods:
+        try:
+            if same_device(source_path, destination_path):
+                if placement_mode == 'reflink':
+                    return write_atomically(reflink_file, source_path, destination_path, sync_data)
+                link_methods[placement_mode](source_path, destination_path)
+                return placement_mode
+        except OSError:
+            # The filesystem or platform can't make this link, copy instead
+            pass
+
+    return write_atomically(copy_file, source_path, destination_path, sync_data)
+
+def place_file(source_path, destination_path, placement_mode='copy', replace=False, run_journal=None, fsync_batch=None):
+    # Links can't be renamed over an existing destination, so remove it first (copies replace it atomically)
+    if replace and placement_mode in link_methods and os.path.lexists(destination_path):
+        os.remove(destination_path)
+
+    # Wait for the files per second limit, if one is set
+    io_throttle.take_operation()
+
+    # Journal the placement before it starts (write-ahead) so a crash part way through can be detected
+    if run_journal:
+        run_journal.record('started', source_path, destination_path, placement_mode=placement_mode, replace=replace)
+
+    try:
+        # Copies are flushed before the rename when every song is synced on its own
+        placement_method = make_placement(source_path, destination_path, placement_mode, fsync_batch is not None and fsync_batch.fsync_mode == 'file')
+    except Exception:
+        # Partial copies are temporary files that were already removed, the destination was never touched
+        if run_journal:
+            run_journal.record('rolled back', source_path, destination_path)
+        raise
+
+    # Make the new name durable now or with the rest of its batch
+    if fsync_batch:
+        fsync_batch.placed(destination_path)
+
+    if run_journal:
+        run_journal.record('completed', source_path, destination_path)
+    return placement_method
@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+from functools import lru_cache
+import os
+import time
+
+# Filesystems that live on another machine
+network_filesystems = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', '9p', 'afs', 'ceph', 'glusterfs', 'fuse.sshfs', 'fuse.rclone', 'davfs', 'fuse.davfs2'}
+
+@lru_cache(maxsize=None)
+def mounted_filesystems():
+    # Linux lists every mount with its device number, mount point and filesystem type
+    mounts = {}
+    try:
+        with open('/proc/self/mountinfo', 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                separator = fields.index('-')
+                mounts.setdefault(fields[2], (fields[4], fields[separator + 1]))
+    except (OSError, ValueError, IndexError):
+        pass
+    return mounts
+
+@lru_cache(maxsize=None)
+def device_kind(device):
+    # 'network', 'rotational' or 'solid state', where the platform can tell
+    if not hasattr(os, 'major'):
+        return 'solid state'
+    device_number = f"{os.major(device)}:{os.minor(device)}"
+    if mounted_filesystems().get(device_number, ('', ''))[1] in network_filesystems:
+        return 'network'
+
+    # Partitions keep their queue settings on the parent disk
+    for queue_path in (f"/sys/dev/block/{device_number}/queue/rotational", f"/sys/dev/block/{device_number}/../queue/rotational"):
+        try:
+            with open(queue_path, 'r') as f:
+                return 'rotational' if f.read().strip() == '1' else 'solid state'
+        except OSError:
+            continue
+    return 'solid state'
+
+@lru_cache(maxsize=None)
+def device_label(device):
+    # Name a device by its mount point in the run summary when it is known
+    if hasattr(os, 'major'):
+        mount = mounted_filesystems().get(f"{os.major(device)}:{os.minor(device)}")
+        if mount:
+            return mount[0]
+    return f"device {device}"
+
+class CopyScheduler:
+    # Placements in flight at once per device, by kind of device (never more than max_workers)
+    device_limits = {
+        'solid state': 8,
+        'rotational': 2,
+        'network': 4
+    }
+
+    def __init__(self, max_workers=8, worker_initializer=None):
+        self.max_workers = max(1, int(max_workers))
+
+        # Called on each copy worker thread when it starts
+        self.worker_initializer = worker_initializer
+
+        # Folder -> device it is on, destination folders that don't exist yet use their nearest parent
+        self.folder_devices = {}
+
+        # (role, device) -> placements in flight, where role is 'read' for sources and 'write' for destinations
+        self.in_flight = {}
+
+        # (role, device) -> [bytes, seconds with placements in flight, time the device last became busy]
+        self.device_stats = {}
+
+    def folder_device(self, folder_path):
+        device = self.folder_devices.get(folder_path)
+        if device is None:
+            try:
+                device = os.stat(folder_path).st_dev
+            except OSError:
+                parent_path = os.path.dirname(folder_path)
+                device = self.folder_device(parent_path) if parent_path and parent_path != folder_path else 0
+            self.folder_devices[folder_path] = device
+        return device
+
+    def limit(self, device):
+        return min(self.max_workers, self.device_limits[device_kind(device)])
+
+    def has_slot(self, source_device, destination_device):
+        return (self.in_flight.get(('read', source_device), 0) < self.limit(source_device) and
+                self.in_flight.get(('write', destination_device), 0) < self.limit(destination_device))
+
+    def start(self, devices):
+        for key in (('read', devices[0]), ('write', devices[1])):
+            if not self.in_flight.get(key):
+                self.device_stats.setdefault(key, [0, 0.0, 0.0])[2] = time.perf_counter()
+            self.in_flight[key] = self.in_flight.get(key, 0) + 1
+
+    def finish(self, devices, size):
+        for key in (('read', devices[0]), ('write', devices[1])):
+            self.in_flight[key] -= 1
+            stats = self.device_stats[key]
+            stats[0] += size
+            if not self.in_flight[key]:
+                stats[1] += time.perf_counter() - stats[2]
+
+    def run(self, entries, place_entry, checkpoint=None):
+        # Queue the plan entries by source and destination device so a slow device never holds up a fast one
+        device_queues = {}
+        for entry in entries:
+            devices = (self.folder_device(entry.source_folder), self.folder_device(entry.destination_folder))
+            device_queues.setdefault(devices, deque()).append(entry)
+
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, initializer=self.worker_initializer) as pool:
+            while device_queues or running:
+                # Waits while the run is paused, and once it is cancelled nothing new is started
+                if checkpoint and checkpoint():
+                    device_queues.clear()
+
+                # Start as many placements as the device limits allow
+                for devices in list(device_queues):
+                    device_queue = device_queues[devices]
+                    while device_queue and len(running) < self.max_workers and self.has_slot(*devices):
+                        entry = device_queue.popleft()
+                        self.start(devices)
+                        running[pool.submit(place_entry, entry)] = (entry, devices)
+                    if not device_queue:
+                        del device_queues[devices]
+
+                # Hand back each placement as it finishes, which frees its slots
+                done, not_done = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    entry, devices = running.pop(future)
+                    self.finish(devices, entry.stat_key[0] if entry.stat_key else 0)
+                    yield entry, future
+
+    def throughput(self):
+        # Megabytes and megabytes per second (while busy) read from or written to each device
+        device_throughput = {}
+        for (role, device), (size, busy_seconds, busy_since) in self.device_stats.items():
+            megabytes = size / 1024 / 1024
+            device_throughput[(role, device_label(device))] = (megabytes, megabytes / busy_seconds if busy_seconds else 0.0)
+        return device_throughput
@@ -0,0 +1,44 @@
+import os
+
+def name_key(path_in_str):
+    # Windows separators are normalised, case is folded for every filesystem
+    return os.path.normcase(path_in_str).casefold()
+
+class DestinationIndex:
+    def __init__(self):
+        # Album folder -> set of file names in it, filled the first time the folder is touched
+        self.folders = {}
+
+        # Statistics for the run summary
+        self.lookups = 0
+        self.folders_listed = 0
+
+    def folder_names(self, new_location):
+        # Names are compared without case on every platform: vfat/exFAT drives, APFS and many SMB mounts ignore case on
+        # Linux and macOS too, and a name that only matches by case costs an identity check or a prompt, not an overwrite
+        folder_key = name_key(new_location)
+        names = self.folders.get(folder_key)
+        if names is None:
+            # List the folder once instead of checking each file in it separately
+            names = set()
+            try:
+                with os.scandir(new_location) as entries:
+                    for entry in entries:
+                        names.add(name_key(entry.name))
+            except OSError:
+                # The folder does not exist yet
+                pass
+            self.folders[folder_key] = names
+            self.folders_listed += 1
+        return names
+
+    def contains(self, new_location, file_name):
+        self.lookups += 1
+        return name_key(file_name) in self.folder_names(new_location)
+
+    def add(self, new_location, file_name):
+        self.folder_names(new_location).add(name_key(file_name))
+
+    def stat_calls_avoided(self):
+        # One listing per folder replaces one exists check per song
+        return self.lookups - self.folders_listed
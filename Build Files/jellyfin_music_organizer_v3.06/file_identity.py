@@ -0,0 +1,57 @@
+import hashlib
+import os
+
+# Bytes hashed from the start and the end of a file for the quick partial hash
+partial_hash_size = 64 * 1024
+
+def partial_hash(path_in_str, size):
+    # Hash the first and last block, which covers the tags and the end of the audio
+    file_hash = hashlib.blake2b(str(size).encode())
+    with open(path_in_str, 'rb') as f:
+        file_hash.update(f.read(partial_hash_size))
+        if size > partial_hash_size:
+            f.seek(max(partial_hash_size, size - partial_hash_size))
+            file_hash.update(f.read(partial_hash_size))
+    return file_hash.hexdigest()
+
+def full_hash(path_in_str, size):
+    file_hash = hashlib.blake2b()
+    with open(path_in_str, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+def cached_hash(hash_function, hash_kind, path_in_str, stat_result, hash_cache):
+    # Reuse a hash from an earlier run while the file's size and mtime are unchanged
+    if hash_cache:
+        file_hash = hash_cache.get_hash(path_in_str, stat_result.st_size, stat_result.st_mtime_ns, hash_kind)
+        if file_hash is not None:
+            return file_hash
+    file_hash = hash_function(path_in_str, stat_result.st_size)
+    if hash_cache:
+        hash_cache.put_hash(path_in_str, stat_result.st_size, stat_result.st_mtime_ns, hash_kind, file_hash)
+    return file_hash
+
+def files_identical(source_path, destination_path, hash_cache=None):
+    # Cheapest checks first: same file, then size, then a partial hash and only then a full hash
+    try:
+        source_stat = os.stat(source_path)
+        destination_stat = os.stat(destination_path)
+    except OSError:
+        return False
+
+    # Hardlinks and symlinks made by an earlier run point at the source itself
+    if (source_stat.st_dev, source_stat.st_ino) == (destination_stat.st_dev, destination_stat.st_ino):
+        return True
+
+    if source_stat.st_size != destination_stat.st_size:
+        return False
+
+    if cached_hash(partial_hash, 'partial', source_path, source_stat, hash_cache) != cached_hash(partial_hash, 'partial', destination_path, destination_stat, hash_cache):
+        return False
+
+    # The partial hash already covered the whole file
+    if source_stat.st_size <= partial_hash_size * 2:
+        return True
+
+    return cached_hash(full_hash, 'full', source_path, source_stat, hash_cache) == cached_hash(full_hash, 'full', destination_path, destination_stat, hash_cache)
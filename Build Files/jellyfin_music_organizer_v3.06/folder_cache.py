@@ -0,0 +1,46 @@
+import os
+import threading
+
+class FolderCache:
+    def __init__(self):
+        # Folders known to exist, shared by everything that creates destination folders in this process
+        self.created_folders = set()
+        self.lock = threading.Lock()
+
+        # Statistics for the run summary
+        self.folder_requests = 0
+        self.mkdir_calls = 0
+
+    def make_folders(self, folder_path):
+        with self.lock:
+            self.folder_requests += 1
+            self.make_folder(folder_path)
+
+    def make_folder(self, folder_path):
+        # Each folder costs one mkdir the first time it is needed and nothing after that
+        if folder_path in self.created_folders:
+            return
+        try:
+            self.mkdir_calls += 1
+            os.mkdir(folder_path)
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            # The parent folder is missing too, create it and try again
+            parent_path = os.path.dirname(folder_path)
+            if not parent_path or parent_path == folder_path:
+                raise
+            self.make_folder(parent_path)
+            self.mkdir_calls += 1
+            os.mkdir(folder_path)
+        self.created_folders.add(folder_path)
+
+    def reset(self):
+        # Forget folders from earlier runs, they may have been deleted since
+        with self.lock:
+            self.created_folders.clear()
+            self.folder_requests = 0
+            self.mkdir_calls = 0
+
+# Folder cache shared by OrganizeThread and ReplaceSkipWindow
+folder_cache = FolderCache()
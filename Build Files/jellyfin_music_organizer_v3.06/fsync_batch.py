@@ -0,0 +1,74 @@
+import os
+import threading
+
+def sync_folder(folder_path):
+    # Flush a folder's entries (new and renamed files) to disk, where the platform allows opening folders
+    try:
+        folder_fd = os.open(folder_path, os.O_RDONLY)
+    except OSError:
+        # Windows can't open a folder this way, its renames are flushed with the file
+        return False
+    try:
+        os.fsync(folder_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(folder_fd)
+    return True
+
+def sync_file(file_path):
+    # Flush a file that was already closed, opening it again for reading is enough for fsync
+    try:
+        with open(file_path, 'rb') as f:
+            os.fsync(f.fileno())
+    except OSError:
+        pass
+
+class FsyncBatch:
+    # Number of placed songs synced together in 'folder' mode
+    batch_size = 256
+
+    def __init__(self, fsync_mode='none'):
+        # 'none' leaves flushing to the operating system, 'file' syncs every song and its folder,
+        # 'folder' syncs songs in batches and each album folder once per batch
+        self.fsync_mode = fsync_mode
+
+        # Songs placed since the last batch and the album folders they were placed in
+        self.pending_files = []
+        self.pending_folders = set()
+        self.lock = threading.Lock()
+
+        # Statistics for the run summary
+        self.fsync_calls = 0
+
+    def placed(self, destination_path):
+        if self.fsync_mode == 'file':
+            # The file itself was synced before it was renamed, only its folder is left
+            with self.lock:
+                self.fsync_calls += 1 + sync_folder(os.path.dirname(destination_path))
+        elif self.fsync_mode == 'folder':
+            with self.lock:
+                self.pending_files.append(destination_path)
+                self.pending_folders.add(os.path.dirname(destination_path))
+                if len(self.pending_files) >= self.batch_size:
+                    self.sync_pending()
+
+    def flush(self):
+        with self.lock:
+            self.sync_pending()
+
+    def sync_pending(self):
+        if not self.pending_files:
+            return
+
+        # Only the songs of this run are flushed, os.sync() would flush every filesystem on the machine
+        for destination_path in self.pending_files:
+            sync_file(destination_path)
+            self.fsync_calls += 1
+
+        # Then each album folder once, however many songs went into it
+        for folder_path in self.pending_folders:
+            self.fsync_calls += sync_folder(folder_path)
+
+        self.pending_files.clear()
+        self.pending_folders.clear()
@@ -0,0 +1,406 @@
+import os
+import re
+import struct
+import uuid
+
+class NeedsMutagen(Exception):
+    # Raised when a song has something the header readers don't handle, mutagen reads it instead
+    pass
+
+def read_exact(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise NeedsMutagen('File ends inside a tag block')
+    return data
+
+def file_size(f):
+    return os.fstat(f.fileno()).st_size
+
+def add_values(found, key, values, text=None):
+    # Keys are kept as mutagen names them, a key seen twice is merged by mutagen in ways not copied here
+    if key in found:
+        raise NeedsMutagen(f"Tag {key} appears more than once")
+    found[key] = (values, str(values) if text is None else text)
+
+# ID3v2 (MP3)
+
+id3_frame_id = re.compile(rb'[A-Z0-9]{4}')
+
+# ID3 text encoding byte -> (codec, terminator)
+id3_text_encodings = {
+    0: ('latin-1', b'\x00'),
+    1: ('utf-16', b'\x00\x00'),
+    2: ('utf-16-be', b'\x00\x00'),
+    3: ('utf-8', b'\x00')
+}
+
+def syncsafe_int(data):
+    # ID3v2.4 sizes use 7 bits per byte
+    return data[0] << 21 | data[1] << 14 | data[2] << 7 | data[3]
+
+def decode_id3_text(body, version):
+    # A text frame holds one or more values, each ended by a terminator (the last one may leave it out)
+    if not body or body[0] not in id3_text_encodings:
+        raise NeedsMutagen('Unknown ID3 text encoding')
+    codec, terminator = id3_text_encodings[body[0]]
+    data = body[1:]
+    values = []
+    while data:
+        # UTF-16 without a byte order mark is guessed at by mutagen
+        if body[0] == 1 and data[:2] not in (b'\xff\xfe', b'\xfe\xff'):
+            raise NeedsMutagen('UTF-16 ID3 text without a byte order mark')
+
+        end = data.find(terminator)
+        while len(terminator) == 2 and end != -1 and end % 2:
+            end = data.find(terminator, end + 1)
+        if end == -1:
+            if len(terminator) == 2 and len(data) % 2:
+                raise NeedsMutagen('Odd length UTF-16 ID3 text')
+            value, data = data, b''
+        else:
+            value, data = data[:end], data[end + len(terminator):]
+        values.append(value.decode(codec))
+
+        # ID3v2.3 had one value per frame, zero padding after it is not an empty second value
+        if version < 4 and not data.strip(b'\x00'):
+            data = b''
+    if not values:
+        raise NeedsMutagen('Empty ID3 text frame')
+    return values
+
+def read_id3_tags(f, wanted_keys):
+    header = read_exact(f, 10)
+    version, flags = header[3], header[5]
+    # ID3v2.2 uses three letter frames, unsynchronisation and extended headers are rare and left to mutagen
+    if header[:3] != b'ID3' or version not in (3, 4) or flags & 0xC0 or any(byte & 0x80 for byte in header[6:10]):
+        raise NeedsMutagen('Unsupported ID3 header')
+    tag_end = 10 + syncsafe_int(header[6:10])
+
+    # mutagen also needs the MPEG audio, a song cut short or without a frame sync right after the tag is left to it
+    f.seek(tag_end)
+    if f.read(2)[:1] != b'\xff':
+        raise NeedsMutagen('No MPEG frame after the ID3 tag')
+    f.seek(10)
+
+    found = {}
+    position = 10
+    while position + 10 <= tag_end:
+        frame_header = read_exact(f, 10)
+        frame_id = frame_header[:4]
+        if frame_id == b'\x00\x00\x00\x00':
+            # Padding until the end of the tag
+            break
+        if not id3_frame_id.fullmatch(frame_id):
+            raise NeedsMutagen('Invalid ID3 frame')
+        if version == 4 and any(byte & 0x80 for byte in frame_header[4:8]):
+            # iTunes wrote some ID3v2.4 sizes as plain integers, mutagen guesses which
+            raise NeedsMutagen('ID3v2.4 frame size is not syncsafe')
+        frame_size = syncsafe_int(frame_header[4:8]) if version == 4 else struct.unpack('>I', frame_header[4:8])[0]
+        position += 10 + frame_size
+        if position > tag_end:
+            raise NeedsMutagen('ID3 frame runs past the end of the tag')
+
+        key = frame_id.decode('ascii')
+        if key.lower() not in wanted_keys:
+            # Skip the frame without reading it, this is where cover art (APIC) is passed over
+            f.seek(frame_size, os.SEEK_CUR)
+            continue
+
+        # Compressed, encrypted or grouped frames (and ID3v2.4 per frame unsynchronisation) are left to mutagen
+        if frame_header[9] & (0x4F if version == 4 else 0xE0):
+            raise NeedsMutagen('Unsupported ID3 frame flags')
+        values = decode_id3_text(read_exact(f, frame_size), version)
+        # mutagen shows a text frame as its values joined with NUL characters
+        add_values(found, key, values, '\x00'.join(values))
+    return found
+
+# Vorbis comments (FLAC, Ogg Vorbis, Opus)
+
+def valid_vorbis_key(key):
+    return bool(key) and all(' ' <= character <= '}' and character != '=' for character in key)
+
+def read_vorbis_comments(data, wanted_keys, framing):
+    # Vendor string, then a count of "KEY=value" comments, all lengths little endian
+    vendor_length, = struct.unpack_from('<I', data, 0)
+    position = 4 + vendor_length
+    count, = struct.unpack_from('<I', data, position)
+    position += 4
+
+    found = {}
+    for i in range(count):
+        length, = struct.unpack_from('<I', data, position)
+        position += 4
+        comment = data[position:position + length]
+        if len(comment) != length:
+            raise NeedsMutagen('Vorbis comment runs past the end of the block')
+        position += length
+
+        # Decoded the way mutagen does, replacing invalid UTF-8 and non-ASCII key characters
+        key, separator, value = comment.decode('utf-8', 'replace').partition('=')
+        if not separator:
+            continue
+        key = key.encode('ascii', 'replace').decode('ascii')
+        if valid_vorbis_key(key) and key.lower() in wanted_keys:
+            # Keys are case insensitive, mutagen lists every value of a key under its lowercase name
+            found.setdefault(key.lower(), []).append(value)
+
+    # Ogg Vorbis ends the comments with a framing bit, mutagen refuses the file without it
+    if framing and not (data[position:position + 1] and data[position] & 0x01):
+        raise NeedsMutagen('Vorbis comment framing bit is unset')
+    return {key: (values, str(values)) for key, values in found.items()}
+
+def read_flac_tags(f, wanted_keys):
+    if read_exact(f, 4) != b'fLaC':
+        raise NeedsMutagen('Not a FLAC stream')
+
+    # Walk the metadata block headers, only the Vorbis comment block is read
+    comment_block = None
+    last_block = False
+    while not last_block:
+        block_header = read_exact(f, 4)
+        last_block = bool(block_header[0] & 0x80)
+        block_type = block_header[0] & 0x7F
+        block_size = int.from_bytes(block_header[1:4], 'big')
+        if block_type == 4:
+            if comment_block is not None:
+                raise NeedsMutagen('More than one Vorbis comment block')
+            comment_block = read_exact(f, block_size)
+        elif block_type == 127:
+            raise NeedsMutagen('Invalid FLAC metadata block')
+        else:
+            # Pictures and padding are skipped without being read
+            f.seek(block_size, os.SEEK_CUR)
+
+    # mutagen reads every block, so a file cut short inside one is left to it
+    if f.tell() > file_size(f):
+        raise NeedsMutagen('File ends inside a FLAC metadata block')
+    if comment_block is None:
+        return {}
+    return read_vorbis_comments(comment_block, wanted_keys, framing=False)
+
+def read_ogg_packets(f, count):
+    # Reassemble the first packets of the file's only logical stream from its pages
+    # Packets grow in place, a comment packet with cover art spans hundreds of pages
+    packets = [bytearray()]
+    serial = None
+    while len(packets) <= count:
+        page_header = read_exact(f, 27)
+        if page_header[:4] != b'OggS' or page_header[4] != 0:
+            raise NeedsMutagen('Invalid Ogg page')
+        if serial is not None and page_header[14:18] != serial:
+            # Chained or multiplexed streams are left to mutagen
+            raise NeedsMutagen('More than one Ogg stream')
+        first_page = serial is None
+        serial = page_header[14:18]
+
+        # Packets are split into segments of up to 255 bytes, a shorter segment ends a packet
+        segment_sizes = read_exact(f, page_header[26])
+        page_data = read_exact(f, sum(segment_sizes))
+        position = 0
+        for segment_size in segment_sizes:
+            packets[-1] += page_data[position:position + segment_size]
+            position += segment_size
+            if segment_size < 255:
+                packets.append(bytearray())
+
+        # The identification packet has a page to itself, mutagen reads the comments from the pages after it
+        if first_page and (len(packets) != 2 or packets[-1]):
+            raise NeedsMutagen('Identification packet is not alone on the first page')
+    return [bytes(packet) for packet in packets[:count]]
+
+def read_ogg_tags(f, wanted_keys):
+    identification, comments = read_ogg_packets(f, 2)
+    if identification.startswith(b'\x01vorbis') and comments.startswith(b'\x03vorbis'):
+        return read_vorbis_comments(comments[7:], wanted_keys, framing=True)
+    if identification.startswith(b'OpusHead') and comments.startswith(b'OpusTags'):
+        return read_vorbis_comments(comments[8:], wanted_keys, framing=False)
+    # Ogg FLAC, Speex and Theora are left to mutagen
+    raise NeedsMutagen('Unsupported Ogg codec')
+
+# MP4 atoms (M4A, M4B)
+
+def read_atom_header(f, end):
+    # Size and name of the atom at the current position, size 1 means a 64 bit size follows and 0 means up to the end
+    start = f.tell()
+    size, name = struct.unpack('>I4s', read_exact(f, 8))
+    if size == 1:
+        size, = struct.unpack('>Q', read_exact(f, 8))
+    elif size == 0:
+        size = end - start
+    if size < f.tell() - start or start + size > end:
+        raise NeedsMutagen('Invalid MP4 atom size')
+    return name, start + size
+
+def find_atom(f, names, end):
+    # Follow a path of atoms (moov, udta, meta, ilst) and return where the last one ends
+    for name in names:
+        while True:
+            if f.tell() >= end:
+                return None
+            atom_name, atom_end = read_atom_header(f, end)
+            if atom_name == name:
+                end = atom_end
+                # meta is a full atom, its children come after a version and flags field
+                if name == b'meta':
+                    f.seek(4, os.SEEK_CUR)
+                break
+            # Skip the atom without reading it, this is where the audio (mdat) is passed over
+            f.seek(atom_end)
+    return end
+
+def read_mp4_tags(f, wanted_keys):
+    f.seek(4)
+    if read_exact(f, 4) != b'ftyp':
+        raise NeedsMutagen('Not an MP4 file')
+    f.seek(0)
+    ilst_end = find_atom(f, (b'moov', b'udta', b'meta', b'ilst'), file_size(f))
+    if ilst_end is None:
+        return {}
+
+    found = {}
+    while f.tell() < ilst_end:
+        atom_name, atom_end = read_atom_header(f, ilst_end)
+        key = atom_name.decode('latin-1')
+        if key.lower() not in wanted_keys:
+            # Cover art (covr) and other items are skipped without being read
+            f.seek(atom_end)
+            continue
+
+        # Each value is a data atom, flags 1 marks UTF-8 text (0 is implicit text)
+        data = read_exact(f, atom_end - f.tell())
+        values = []
+        position = 0
+        while position < len(data):
+            data_size, data_name, flags = struct.unpack_from('>I4sI', data, position)
+            if data_name != b'data' or data_size < 16 or flags & 0xFFFFFF not in (0, 1) or position + data_size > len(data):
+                raise NeedsMutagen(f"Unsupported MP4 {key} atom")
+            values.append(data[position + 16:position + data_size].decode('utf-8'))
+            position += data_size
+        if not values:
+            raise NeedsMutagen(f"Empty MP4 {key} atom")
+        add_values(found, key, values)
+    return found
+
+# ASF (WMA)
+
+asf_header_guid = uuid.UUID('75B22630-668E-11CF-A6D9-00AA0062CE6C').bytes_le
+asf_content_description_guid = uuid.UUID('75B22633-668E-11CF-A6D9-00AA0062CE6C').bytes_le
+asf_extended_content_description_guid = uuid.UUID('D2D0A440-E307-11D2-97F0-00A0C95EA850').bytes_le
+asf_header_extension_guid = uuid.UUID('5FBF03B5-A92E-11CF-8EE3-00C00C205365').bytes_le
+asf_metadata_guid = uuid.UUID('C5F8CBEA-5BAF-4877-8467-AA8C44FA4CCA').bytes_le
+asf_metadata_library_guid = uuid.UUID('44231C94-9498-49D1-A141-1D134E457054').bytes_le
+
+# Content description fields in the order they are stored
+asf_content_description_names = ['Title', 'Author', 'Copyright', 'Description', 'Rating']
+
+def decode_asf_text(data):
+    return data.decode('utf-16-le').strip('\x00')
+
+def asf_attribute_text(value, language, stream):
+    # The way mutagen shows an ASFUnicodeAttribute
+    text = f"ASFUnicodeAttribute({value!r}"
+    if language:
+        text += f", language={language}"
+    if stream:
+        text += f", stream={stream}"
+    return text + ')'
+
+def read_asf_attributes(guid, data, wanted_keys, attributes):
+    # Adds (name, value, language, stream) for the wanted text attributes of one header object to attributes[guid]
+    found = attributes.setdefault(guid, [])
+    if guid == asf_content_description_guid:
+        lengths = struct.unpack_from('<5H', data, 0)
+        position = 10
+        for name, length in zip(asf_content_description_names, lengths):
+            if length and name.lower() in wanted_keys:
+                found.append((name, decode_asf_text(data[position:position + length]), 0, 0))
+            position += length
+        return
+
+    count, = struct.unpack_from('<H', data, 0)
+    position = 2
+    for i in range(count):
+        if guid == asf_extended_content_description_guid:
+            language = stream = 0
+            name_length, = struct.unpack_from('<H', data, position)
+            name = decode_asf_text(data[position + 2:position + 2 + name_length])
+            value_type, value_length = struct.unpack_from('<HH', data, position + 2 + name_length)
+            position += 2 + name_length + 4
+        else:
+            # Metadata and metadata library objects also store a language and stream per attribute
+            language, stream, name_length, value_type, value_length = struct.unpack_from('<HHHHI', data, position)
+            position += 12
+            name = decode_asf_text(data[position:position + name_length])
+            position += name_length
+        if name.lower() in wanted_keys:
+            # Numbers and pictures under an artist or album name are shown differently by mutagen
+            if value_type != 0:
+                raise NeedsMutagen(f"ASF {name} is not text")
+            found.append((name, decode_asf_text(data[position:position + value_length]), language, stream))
+        position += value_length
+
+def read_asf_tags(f, wanted_keys):
+    header = read_exact(f, 30)
+    if header[:16] != asf_header_guid:
+        raise NeedsMutagen('Not an ASF file')
+    header_size, object_count = struct.unpack_from('<QI', header, 16)
+    if header_size > file_size(f):
+        raise NeedsMutagen('File ends inside the ASF header')
+
+    attributes = {}
+    for i in range(object_count):
+        guid, object_size = struct.unpack('<16sQ', read_exact(f, 24))
+        if object_size < 24:
+            raise NeedsMutagen('Invalid ASF object size')
+        if guid in (asf_content_description_guid, asf_extended_content_description_guid):
+            read_asf_attributes(guid, read_exact(f, object_size - 24), wanted_keys, attributes)
+        elif guid == asf_header_extension_guid:
+            # The metadata objects live inside the header extension, after its reserved fields
+            data = read_exact(f, object_size - 24)
+            data_size, = struct.unpack_from('<I', data, 18)
+            position = 22
+            while position < 22 + data_size:
+                inner_guid, inner_size = struct.unpack_from('<16sQ', data, position)
+                if inner_size < 24:
+                    raise NeedsMutagen('Invalid ASF object size')
+                if inner_guid in (asf_metadata_guid, asf_metadata_library_guid):
+                    read_asf_attributes(inner_guid, data[position + 24:position + inner_size], wanted_keys, attributes)
+                position += inner_size
+        else:
+            f.seek(object_size - 24, os.SEEK_CUR)
+
+    # mutagen lists the attributes object by object in this order, and a name's values in the order they were found
+    found = {}
+    for guid in (asf_content_description_guid, asf_extended_content_description_guid, asf_metadata_guid, asf_metadata_library_guid):
+        for name, value, language, stream in attributes.get(guid, []):
+            values, texts = found.setdefault(name, ([], []))
+            values.append(value)
+            texts.append(asf_attribute_text(value, language, stream))
+    return {name: (values, f"[{', '.join(texts)}]") for name, (values, texts) in found.items()}
+
+# Header reader for each extension, the reader also checks the file really is that format
+header_readers = {
+    '.mp2': read_id3_tags,
+    '.mp3': read_id3_tags,
+    '.flac': read_flac_tags,
+    '.ogg': read_ogg_tags,
+    '.opus': read_ogg_tags,
+    '.m4a': read_mp4_tags,
+    '.m4b': read_mp4_tags,
+    '.m4r': read_mp4_tags,
+    '.mp4': read_mp4_tags,
+    '.wma': read_asf_tags
+}
+
+def read_header_tags(path_in_str, wanted_keys):
+    # Read only the tag blocks at the start of the song and return {key: (values, text)} for the keys
+    # whose lowercase name is in wanted_keys, or None when the song has to be read by mutagen
+    header_reader = header_readers.get(os.path.splitext(path_in_str)[1].lower())
+    if header_reader is None:
+        return None
+    try:
+        with open(path_in_str, 'rb') as f:
+            return header_reader(f, wanted_keys)
+    except (NeedsMutagen, OSError, UnicodeError, struct.error):
+        # Errors are reported by mutagen so they read the same as before
+        return None
@@ -0,0 +1,86 @@
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+class TokenBucket:
+    def __init__(self, rate=0):
+        # Tokens per second, 0 means unlimited
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self.lock:
+            self.refill()
+            self.rate = rate
+            # Start the new rate with at most one second of burst
+            self.tokens = min(self.tokens, rate)
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, amount):
+        with self.lock:
+            if not self.rate:
+                return
+            self.refill()
+            # Tokens may go negative, the caller then waits until the debt is paid back
+            self.tokens -= amount
+            wait_seconds = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait_seconds:
+            time.sleep(wait_seconds)
+
+class IoThrottle:
+    # Largest piece of a file copied between checks while a bytes limit is set
+    chunk_size = 1024 * 1024
+
+    def __init__(self):
+        self.bytes_bucket = TokenBucket()
+        self.operations_bucket = TokenBucket()
+        # Threads inside unthrottled() copy at full speed while the others keep the limits
+        self.exempt = threading.local()
+
+    def set_limits(self, megabytes_per_second=0, files_per_second=0):
+        # Can be called while a run is in progress, copies pick up the new limits on their next chunk
+        self.bytes_bucket.set_rate(int(megabytes_per_second * 1024 * 1024))
+        self.operations_bucket.set_rate(files_per_second)
+
+    @contextmanager
+    def unthrottled(self):
+        # For copies the user is waiting on, e.g. ReplaceSkipWindow placing songs on the GUI thread
+        self.exempt.active = True
+        try:
+            yield
+        finally:
+            self.exempt.active = False
+
+    def is_exempt(self):
+        return getattr(self.exempt, 'active', False)
+
+    def take_bytes(self, wanted):
+        # Returns how many bytes may be copied now, waiting first if the limit has been used up
+        if not self.bytes_bucket.rate or self.is_exempt():
+            return wanted
+        allowed = min(wanted, self.chunk_size)
+        self.bytes_bucket.take(allowed)
+        return allowed
+
+    def take_operation(self):
+        if not self.is_exempt():
+            self.operations_bucket.take(1)
+
+def lower_io_priority():
+    # On Linux the disk scheduler derives a thread's I/O priority from its nice value, so this only slows the calling copy worker
+    if sys.platform.startswith('linux'):
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        except OSError:
+            pass
+
+# Throttle shared by OrganizeThread, ReplaceSkipWindow and SettingsWindow (which changes it live)
+io_throttle = IoThrottle()
@@ -1,4 +1,5 @@
 from PyQt5.QtWidgets import QApplication
+import multiprocessing
 import qdarkstyle
 
 # Other classes within files
@@ -6,6 +7,8 @@ from music_organizer import MusicOrganizer
 
 # Create and run application
 if __name__ == '__main__':
+    # Tag reader processes re-run this file when frozen by PyInstaller
+    multiprocessing.freeze_support()
     app = QApplication([])
     app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
     window = MusicOrganizer()
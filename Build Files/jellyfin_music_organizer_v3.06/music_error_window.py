@@ -7,6 +7,8 @@ import openpyxl
 import json
 import csv
 
+from tag_reader import read_full_metadata
+
 class MusicErrorWindow(QWidget):
     windowOpened = pyqtSignal(bool)
     windowClosed = pyqtSignal(bool)
@@ -181,7 +183,7 @@ class MusicErrorWindow(QWidget):
     def populate_list_widget(self):
         # Populate the file list
         for info in self.error_files:
-            file_name = info['file_name']
+            file_name = info.file_name
             self.file_list_widget.addItem(file_name)
 
         # Set the first item as the current row 
@@ -195,15 +197,21 @@ class MusicErrorWindow(QWidget):
         selected_file = current_item.text()
 
         # Find the corresponding error_info
-        selected_info = next((info for info in self.error_files if info['file_name'] == selected_file), None)
+        selected_info = next((info for info in self.error_files if info.file_name == selected_file), None)
 
         # Update the details display with file name, error, artist_found, album_found, and metadata information
         if selected_info:
-            file_name = selected_info['file_name']
-            error = selected_info['error']
-            artist_found = selected_info['artist_found']
-            album_found = selected_info['album_found']
-            metadata_dict = selected_info['metadata_dict']
+            file_name = selected_info.file_name
+            error = selected_info.error
+            artist_found = selected_info.artist_found
+            album_found = selected_info.album_found
+            metadata_dict = selected_info.metadata_dict
+
+            # The error record only keeps short text tags, read the song again to show all of them in full
+            try:
+                metadata_dict = read_full_metadata(selected_info.path_in_str)
+            except Exception:
+                pass
 
             details_text = f"File Name: {file_name}\n"
             details_text += f"Error: {error}\n"
@@ -254,18 +262,18 @@ class MusicErrorWindow(QWidget):
             try:
                 with open(file_name, 'w', encoding='utf-8') as file:
                     for info in self.error_files:
-                        file.write(f"File Name: {info['file_name']}\n")
-                        file.write(f"Error: {info['error']}\n")
-                        if info['artist_found']:
-                            file.write(f"Artist Found: {info['artist_found'][0]}\n")
+                        file.write(f"File Name: {info.file_name}\n")
+                        file.write(f"Error: {info.error}\n")
+                        if info.artist_found:
+                            file.write(f"Artist Found: {info.artist_found[0]}\n")
                         else:
                             file.write("Artist Found: False\n")
-                        if info['album_found']:
-                            file.write(f"Album Found: {info['album_found'][0]}\n\n")
+                        if info.album_found:
+                            file.write(f"Album Found: {info.album_found[0]}\n\n")
                         else:
                             file.write("Album Found: False\n\n")
                         file.write("Metadata:\n")
-                        metadata_dict = info['metadata_dict']
+                        metadata_dict = info.metadata_dict
                         if metadata_dict:
                             for key, value in metadata_dict.items():
                                 file.write(f"{key}: {value}\n")
@@ -306,18 +314,18 @@ class MusicErrorWindow(QWidget):
                 rows = []
 
                 # Determine the maximum number of metadata fields
-                max_metadata_fields = max(len(info['metadata_dict']) for info in self.error_files)
+                max_metadata_fields = max(len(info.metadata_dict) for info in self.error_files)
 
                 # Generate rows
                 for info in self.error_files:
-                    metadata_dict = {str(key): str(value) for key, value in info['metadata_dict'].items()}
+                    metadata_dict = {str(key): str(value) for key, value in info.metadata_dict.items()}
 
                     # Get the first value from the list if available
-                    artist_found = info['artist_found'][0] if info['artist_found'] else "None"
-                    album_found = info['album_found'][0] if info['album_found'] else "None"
+                    artist_found = info.artist_found[0] if info.artist_found else "None"
+                    album_found = info.album_found[0] if info.album_found else "None"
 
                     # Create an empty row
-                    row = [info['file_name'], info['error'], artist_found, album_found]
+                    row = [info.file_name, info.error, artist_found, album_found]
 
                     # Generate metadata keys and values for the current row
                     metadata_keys = list(metadata_dict.keys())
@@ -389,15 +397,15 @@ class MusicErrorWindow(QWidget):
                 rows = []
                 max_metadata_columns = 0
                 for info in self.error_files:
-                    metadata_dict = {str(key): str(value) for key, value in info['metadata_dict'].items()}
+                    metadata_dict = {str(key): str(value) for key, value in info.metadata_dict.items()}
 
                     # Extract values from the list if available
-                    artist_found = info['artist_found'][0] if info['artist_found'] else "None"
-                    album_found = info['album_found'][0] if info['album_found'] else "None"
+                    artist_found = info.artist_found[0] if info.artist_found else "None"
+                    album_found = info.album_found[0] if info.album_found else "None"
 
                     row = [
-                        info['file_name'],
-                        info['error'],
+                        info.file_name,
+                        info.error,
                         artist_found,
                         album_found
                     ]
@@ -486,14 +494,14 @@ class MusicErrorWindow(QWidget):
             try:
                 data = []
                 for info in self.error_files:
-                    metadata_dict = {str(key): str(value) for key, value in info['metadata_dict'].items()}
+                    metadata_dict = {str(key): str(value) for key, value in info.metadata_dict.items()}
                     
-                    artist_found = info['artist_found'][0] if info['artist_found'] else "False"
-                    album_found = info['album_found'][0] if info['album_found'] else "False"
+                    artist_found = info.artist_found[0] if info.artist_found else "False"
+                    album_found = info.album_found[0] if info.album_found else "False"
                     
                     row_data = {
-                        'filename': info['file_name'],
-                        'error': info['error'],
+                        'filename': info.file_name,
+                        'error': info.error,
                         'artist_found': artist_found,
                         'album_found': album_found,
                         'metadata_dict': metadata_dict
@@ -1,7 +1,7 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                             QPushButton, QProgressBar, QApplication,
                             QFileDialog, QSizeGrip, QSpacerItem, QSizePolicy)
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QIcon
 import json
 from resources_rc import *
@@ -13,6 +13,9 @@ from custom_dialog import CustomDialog
 from music_error_window import MusicErrorWindow
 from replace_skip_window import ReplaceSkipWindow
 from settings_window import SettingsWindow
+from run_journal import RunJournal
+from plan import export_plan
+from progress_tracker import describe_progress
 
 class MusicOrganizer(QWidget):
     def __init__(self):
@@ -25,6 +28,11 @@ class MusicOrganizer(QWidget):
         self.music_folder_path = ''
         self.destination_folder_path = ''
 
+        # Settings saved in SettingsWindow while a run was in progress
+        self.settings_changed_during_run = False
+        # The settings window can stay open while a run ends, the controls stay disabled until it is closed
+        self.settings_open = False
+
         # Setup and show user interface
         self.setup_ui()
 
@@ -159,10 +167,48 @@ class MusicOrganizer(QWidget):
         vbox_main_layout.addWidget(self.organize_button)
         self.organize_button.clicked.connect(self.organize_function)
 
+        # Create dry run button, plans the run and exports the plan without touching the destination folder
+        self.dry_run_button = QPushButton('Dry Run (Export Plan)')
+        if not self.music_folder_path or not self.destination_folder_path:
+            self.dry_run_button.setEnabled(False)
+        else:
+            self.dry_run_button.setEnabled(True)
+        vbox_main_layout.addWidget(self.dry_run_button)
+        self.dry_run_button.clicked.connect(self.dry_run_function)
+
+        # Create resume button, enabled when the last run into the destination folder was interrupted
+        self.resume_button = QPushButton('Resume Interrupted Run')
+        self.update_resume_button()
+        vbox_main_layout.addWidget(self.resume_button)
+        self.resume_button.clicked.connect(self.resume_function)
+
+        # QHBoxLayout setup for pause and cancel buttons
+        hbox_run_controls_layout = QHBoxLayout()
+        vbox_main_layout.addLayout(hbox_run_controls_layout)
+
+        # Create pause and cancel buttons, only enabled while a run is in progress
+        self.pause_button = QPushButton('Pause')
+        self.pause_button.setEnabled(False)
+        hbox_run_controls_layout.addWidget(self.pause_button)
+        self.pause_button.clicked.connect(self.pause_function)
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.setToolTip('Songs being placed are finished, the run can be resumed later')
+        hbox_run_controls_layout.addWidget(self.cancel_button)
+        self.cancel_button.clicked.connect(self.cancel_function)
+
         # Create label for number of songs
         self.number_songs_label = QLabel("")
         vbox_main_layout.addWidget(self.number_songs_label)
 
+        # Create label for the run summary
+        self.run_summary_label = QLabel("")
+        vbox_main_layout.addWidget(self.run_summary_label)
+
+        # Create label for the throughput and time left, shown above the progress bar
+        self.progress_stats_label = QLabel("")
+        vbox_main_layout.addWidget(self.progress_stats_label)
+
         # QHBoxLayout setup for progress bar and grip
         hbox_progress_grip_layout = QHBoxLayout()
         vbox_main_layout.addLayout(hbox_progress_grip_layout)
@@ -173,6 +219,13 @@ class MusicOrganizer(QWidget):
         self.music_progress_bar.setMaximum(100)
         hbox_progress_grip_layout.addWidget(self.music_progress_bar)
 
+        # OrganizeThread's progress is kept as the latest snapshot and drawn by this timer
+        self.latest_progress = None
+        self.latest_progress_stats = None
+        self.progress_render_timer = QTimer(self)
+        self.progress_render_timer.setInterval(100)
+        self.progress_render_timer.timeout.connect(self.render_progress)
+
         # Add resizing handles
         self.bottom_right_grip = QSizeGrip(self)
         self.bottom_right_grip.setToolTip('Resize window')
@@ -193,8 +246,11 @@ class MusicOrganizer(QWidget):
             # Check if settings are empty
             if not self.music_folder_path or not self.destination_folder_path:
                 self.organize_button.setEnabled(False)
+                self.dry_run_button.setEnabled(False)
             else:
                 self.organize_button.setEnabled(True)
+                self.dry_run_button.setEnabled(True)
+            self.update_resume_button()
             self.reset_progress_songs_label()
 
     def select_destination_folder(self):
@@ -205,14 +261,26 @@ class MusicOrganizer(QWidget):
             # Check if settings are empty
             if not self.music_folder_path or not self.destination_folder_path:
                 self.organize_button.setEnabled(False)
+                self.dry_run_button.setEnabled(False)
             else:
                 self.organize_button.setEnabled(True)
+                self.dry_run_button.setEnabled(True)
+            self.update_resume_button()
             self.reset_progress_songs_label()
 
+    def update_resume_button(self):
+        # Only offer to resume when the journal in the destination folder belongs to this music folder
+        if not self.music_folder_path or not self.destination_folder_path:
+            self.resume_button.setEnabled(False)
+        else:
+            self.resume_button.setEnabled(RunJournal(self.destination_folder_path).resumable_run(self.music_folder_path))
+
     def reset_progress_songs_label(self):
         self.music_progress_bar.setValue(0)  # Reset the progress bar to 0
         self.music_progress_bar.setStyleSheet("") # Reset the style sheet to default
         self.number_songs_label.setText('') # Reset number of songs label
+        self.run_summary_label.setText('') # Reset run summary label
+        self.progress_stats_label.setText('') # Reset throughput and time left label
 
     def load_settings(self):
         try:
@@ -228,43 +296,101 @@ class MusicOrganizer(QWidget):
                 # Check if settings are empty
                 if not self.music_folder_path or not self.destination_folder_path:
                     self.organize_button.setEnabled(False)
+                    self.dry_run_button.setEnabled(False)
                 else:
                     self.organize_button.setEnabled(True)
+                    self.dry_run_button.setEnabled(True)
+                self.update_resume_button()
         except FileNotFoundError:
             # Initialize self.settings dictionary
             self.settings = {}
 
-    def organize_function(self):
+    def resume_function(self):
+        # Continue the interrupted run from its journal
+        self.organize_function(resume=True)
+
+    def dry_run_function(self):
+        # Plan the run without carrying it out
+        self.organize_function(dry_run=True)
+
+    def organize_function(self, resume=False, dry_run=False):
+        # Pick up settings saved while the previous run was in progress
+        if self.settings_changed_during_run:
+            self.settings_changed_during_run = False
+            self.load_settings()
         # Disable UI elements
         self.user_interface(False)
+        # Keep settings open during the run so the copy speed limit can be changed
+        self.settings_button.setEnabled(True)
+        # Initialize progress bar at zero percent
+        self.reset_progress_songs_label()
         # Variables needed in OrganizeThread
         info = {
             'selected_music_folder_path':self.music_folder_path,
-            'selected_destination_folder_path':self.destination_folder_path
+            'selected_destination_folder_path':self.destination_folder_path,
+            'tag_reader_threads':self.settings.get('tag_reader_threads', 8),
+            'tag_reader_mode':self.settings.get('tag_reader_mode', 'threads'),
+            'tag_cache_enabled':self.settings.get('tag_cache_enabled', True),
+            'skip_unchanged_songs':self.settings.get('skip_unchanged_songs', True),
+            'placement_mode':self.settings.get('placement_mode', 'copy'),
+            'fsync_mode':self.settings.get('fsync_mode', 'none'),
+            'copy_workers':self.settings.get('copy_workers', 8),
+            'throttle_megabytes_per_second':self.settings.get('throttle_megabytes_per_second', 0),
+            'throttle_files_per_second':self.settings.get('throttle_files_per_second', 0),
+            'low_io_priority':self.settings.get('low_io_priority', False),
+            'resume':resume,
+            'dry_run':dry_run
         }
         self.organize_thread = OrganizeThread(info)
         self.organize_thread.number_songs_signal.connect(self.number_songs)
-        self.organize_thread.music_progress_signal.connect(self.music_progress)
+        self.organize_thread.music_progress_signal.connect(self.store_progress)
+        self.organize_thread.progress_stats_signal.connect(self.store_progress_stats)
         self.organize_thread.kill_thread_signal.connect(self.kill_thread)
         self.organize_thread.custom_dialog_signal.connect(self.custom_dialog_function)
         self.organize_thread.organize_finish_signal.connect(self.organize_finish)
         self.organize_thread.start()
+        self.progress_render_timer.start()
+        # Enable run controls
+        self.pause_button.setText('Pause')
+        self.pause_button.setEnabled(True)
+        self.cancel_button.setEnabled(True)
+
+    def pause_function(self):
+        if hasattr(self, 'organize_thread'):
+            # The thread stops at its next song until it is told to continue
+            paused = self.pause_button.text() == 'Pause'
+            self.organize_thread.set_paused(paused)
+            self.pause_button.setText('Continue' if paused else 'Pause')
+            if paused:
+                self.progress_stats_label.setText('Paused')
+
+    def cancel_function(self):
+        if hasattr(self, 'organize_thread'):
+            self.organize_thread.request_cancel()
+            self.pause_button.setEnabled(False)
+            self.cancel_button.setEnabled(False)
+            self.progress_stats_label.setText('Cancelling, finishing the songs being placed')
 
     def user_interface(self, msg):
         # Define a list of UI elements to enable/disable
         ui_elements = [self.destination_folder_select_button, self.music_folder_select_button,
-                    self.organize_button, self.close_button, self.settings_button]
+                    self.organize_button, self.dry_run_button, self.resume_button, self.close_button, self.settings_button]
 
-        # Set the enabled state of each element based on the value of msg
-        enabled = msg
+        # Set the enabled state of each element based on the value of msg (the settings window keeps them disabled)
+        enabled = msg and not self.settings_open
         for element in ui_elements:
             element.setEnabled(enabled)
 
-    def number_songs(self, msg):
-        self.number_songs_label.setText(f'Number of songs found: {msg}')
-        if msg:
-            # Initialize progress bar at zero percent
-            self.music_progress(0)
+        # The resume button also depends on whether there is an interrupted run to resume
+        if enabled:
+            self.update_resume_button()
+
+    def number_songs(self, msg, scan_finished):
+        # Songs are organized while the scan is still running, so show a running count until it finishes
+        if scan_finished:
+            self.number_songs_label.setText(f'Number of songs found: {msg}')
+        else:
+            self.number_songs_label.setText(f'Number of songs found so far: {msg}')
 
     def music_progress(self, msg):
         self.music_progress_bar.setValue(int(msg))
@@ -288,8 +414,33 @@ class MusicOrganizer(QWidget):
                 # Reset the style sheet to default
                 self.music_progress_bar.setStyleSheet("")
             
+    def store_progress(self, msg):
+        self.latest_progress = msg
+
+    def store_progress_stats(self, snapshot):
+        self.latest_progress_stats = snapshot
+
+    def render_progress(self):
+        # Draw only what changed since the last tick
+        if self.latest_progress is not None:
+            self.music_progress(self.latest_progress)
+            self.latest_progress = None
+        if self.latest_progress_stats is not None:
+            self.progress_stats(self.latest_progress_stats)
+            self.latest_progress_stats = None
+
+    def progress_stats(self, snapshot):
+        # Songs or bytes done, MB/s, songs/s and time left
+        self.progress_stats_label.setText(describe_progress(snapshot))
+
     def kill_thread(self, msg):
         if msg == 'organize'and hasattr(self, 'organize_thread'):
+            # Draw the last progress the thread sent before the timer stops
+            self.progress_render_timer.stop()
+            self.render_progress()
+            # Disable run controls
+            self.pause_button.setEnabled(False)
+            self.cancel_button.setEnabled(False)
             # Delete OrganizeThread if it exists
             del self.organize_thread
             # Re-enable UI elements
@@ -308,6 +459,12 @@ class MusicOrganizer(QWidget):
         self.kill_thread('organize')
         # Save recall_files for other functions
         self.recall_files = recall_files
+        # Show the run statistics
+        self.run_summary(recall_files['run_stats'])
+        # A dry run only exports its plan
+        if 'plan' in recall_files:
+            self.dry_run_finish(recall_files['plan'])
+            return
         # Replace or Skip Files
         if recall_files['replace_skip_files']:
             if not self.settings.get('mute_sound', False):
@@ -319,10 +476,23 @@ class MusicOrganizer(QWidget):
         else:
             self.replace_skip_finish()
 
+    def dry_run_finish(self, plan):
+        # Set progress bar to maximum
+        self.music_progress(self.music_progress_bar.maximum())
+        export_path, _ = QFileDialog.getSaveFileName(self, 'Export Plan', 'plan_jmo.csv', 'CSV files (*.csv);;JSON files (*.json)')
+        if export_path:
+            try:
+                export_plan(plan, export_path)
+            except OSError as e:
+                self.custom_dialog_function(f'The plan could not be exported: {e}')
+
+    def run_summary(self, run_stats):
+        self.run_summary_label.setText('\n'.join(f'{key}: {value}' for key, value in run_stats.items()))
+
     def organize_replace_skip(self):
         if self.recall_files['replace_skip_files']:
             # Music File Replace Skip Window
-            self.music_replace_skip_window = ReplaceSkipWindow(self.recall_files['replace_skip_files'])
+            self.music_replace_skip_window = ReplaceSkipWindow(self.recall_files['replace_skip_files'], self.destination_folder_path, self.settings.get('placement_mode', 'copy'), self.settings.get('fsync_mode', 'none'), self.recall_files.get('cancelled', False))
             self.music_replace_skip_window.windowClosed.connect(self.replace_skip_finish)
             self.music_replace_skip_window.windowOpened.connect(self.user_interface)
             self.music_replace_skip_window.show()
@@ -354,13 +524,30 @@ class MusicOrganizer(QWidget):
             self.music_error_window.show()
 
     def settings_window(self):
-        # Settings Window
-        self.music_error_window = SettingsWindow()
-        self.music_error_window.windowClosed.connect(self.settings_finish)
-        self.music_error_window.windowOpened.connect(self.user_interface)
-        self.music_error_window.show()
+        # Settings Window, kept apart from the error window since a run can end (and show its errors) while it is open
+        self.settings_open = True
+        self.settings_window_instance = SettingsWindow(run_in_progress=hasattr(self, 'organize_thread'))
+        self.settings_window_instance.windowClosed.connect(self.settings_finish)
+        self.settings_window_instance.windowOpened.connect(self.user_interface)
+        self.settings_window_instance.custom_dialog_signal.connect(self.custom_dialog_function)
+        self.settings_window_instance.show()
+
+    def result_window_open(self):
+        # Whether the Replace or Skip or error window of the last run is still open
+        return any(hasattr(self, name) and getattr(self, name).isVisible() for name in ('music_replace_skip_window', 'music_error_window'))
 
     def settings_finish(self):
+        self.settings_open = False
+        if hasattr(self, 'organize_thread'):
+            # A run is in progress, it has already picked up the new copy speed limit and the rest waits for the next run
+            self.settings_changed_during_run = True
+            self.settings_button.setEnabled(True)
+            return
+        if self.result_window_open():
+            # The run ended while settings were open, its Replace or Skip or error window enables the controls when it closes
+            self.load_settings()
+            self.user_interface(False)
+            return
         self.user_interface(True)
         # Load settings from file if it exists
         self.load_settings()
@@ -0,0 +1,35 @@
+import os
+
+def scan_music_files(root_folder_path, extensions):
+    # Lowercase the extensions once so '.MP3' and '.Flac' match '.mp3' and '.flac'
+    extension_set = {extension.lower() for extension in extensions}
+
+    # Directories still to be walked
+    pending_folders = [root_folder_path]
+
+    # Walk the tree once, classifying every entry as it is listed
+    while pending_folders:
+        folder_path = pending_folders.pop()
+        try:
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            # Symlinked directories are not descended into, the same as Path.glob('**'), so link loops can't repeat songs
+                            pending_folders.append(entry.path)
+                        elif os.path.splitext(entry.name)[1].lower() in extension_set and entry.is_file():
+                            yield entry.path.replace('\\', '/')
+                    except OSError:
+                        # Broken symlinks and entries removed mid-walk are skipped
+                        continue
+        except OSError:
+            # Unreadable folders are skipped the same way Path.glob skipped them
+            continue
+
+def file_stat_key(path_in_str):
+    # Size and modification time identify an unchanged file between runs
+    try:
+        stat_result = os.stat(path_in_str)
+    except OSError:
+        return None
+    return (stat_result.st_size, stat_result.st_mtime_ns)
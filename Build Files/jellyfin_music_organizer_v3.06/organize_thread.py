@@ -1,129 +1,370 @@
 from PyQt5.QtCore import QThread, pyqtSignal
-from pathlib import Path
-import mutagen
-from mutagen.asf import ASFUnicodeAttribute
-import shutil
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future
+from collections import deque
+import os
+import multiprocessing
+import threading
+import queue
+import time
 from resources_rc import *
 
+# Other functions within files
+from music_scanner import scan_music_files, file_stat_key
+from tag_reader import read_music_tags, read_music_tags_batch, blank_music_tags, missing_tags_error
+from tag_cache import TagCache
+from run_manifest import RunManifest
+from copy_engine import place_file, reconcile_interrupted_placements
+from run_journal import RunJournal
+from destination_index import DestinationIndex
+from folder_cache import folder_cache
+from file_identity import files_identical
+from plan import plan_summary
+from song_records import PlanEntry, ErrorRecord
+from path_sanitizer import sanitize_path_component
+from copy_scheduler import CopyScheduler
+from io_throttle import io_throttle, lower_io_priority
+from progress_tracker import ProgressTracker
+from fsync_batch import FsyncBatch
+
 class OrganizeThread(QThread):
-    number_songs_signal = pyqtSignal(int)
+    number_songs_signal = pyqtSignal(int, bool)
     music_progress_signal = pyqtSignal(int)
     kill_thread_signal = pyqtSignal(str)
     custom_dialog_signal = pyqtSignal(str)
     organize_finish_signal = pyqtSignal(dict)
+    progress_stats_signal = pyqtSignal(dict)
+
+    # Maximum number of scanned paths waiting to be organized
+    scan_queue_size = 1000
+    # Number of newly found songs between number of songs label updates
+    scan_report_interval = 250
+    # Number of songs sent to a tag reader process at a time
+    process_shard_size = 64
+    # Least time between progress updates, so tag cache hits don't flood the GUI's event loop with signals
+    progress_interval = 0.1
 
     def __init__(self, info):
         super().__init__()
         self.info = info
 
+        # Running count of songs found by the scan and whether the scan has finished
+        self.songs_found = 0
+        self.scan_finished = False
+
+        # Songs planned, then songs and bytes placed, with their moving average rates
+        self.progress_tracker = ProgressTracker(planning_share=100 if info.get('dry_run', False) else 10)
+        self.last_progress_time = 0.0
+
+        # Set from the GUI thread, checked by the scan, the tag reading loop and the copy dispatcher between songs
+        self.cancel_event = threading.Event()
+        self.unpaused_event = threading.Event()
+        self.unpaused_event.set()
+
+        # What will be done with each song, built by the planner and carried out by the executor
+        self.plan = []
+
+        # A dry run stops after planning and touches nothing in the destination folder
+        self.dry_run = info.get('dry_run', False)
+
+        # Number of songs placed with each link or copy method
+        self.placement_methods_used = {}
+
+        # In-memory index of the files already in the destination folder
+        self.destination_index = DestinationIndex()
+
+        # Tag cache, run manifest and run journal, opened when the run starts
+        self.tag_cache = None
+        self.run_manifest = None
+        self.run_journal = None
+
+        # Syncs placed songs to disk per song, in batches or not at all
+        self.fsync_batch = FsyncBatch(info.get('fsync_mode', 'none'))
+
+        # Runs placements concurrently within per-device limits, optionally at a lower disk priority
+        self.copy_scheduler = CopyScheduler(info.get('copy_workers', 8), lower_io_priority if info.get('low_io_priority', False) else None)
+
+        # Limit copy speed so playback from the destination drive keeps up, SettingsWindow can change this mid-run
+        io_throttle.set_limits(info.get('throttle_megabytes_per_second', 0), info.get('throttle_files_per_second', 0))
+
+        # When resuming, the songs the interrupted run found (if its scan finished) and the ones it placed
+        self.resume_paths = None
+        self.completed_sources = set()
+
     def __del__(self):
         self.wait()
 
+    def request_cancel(self):
+        # Placements already running finish, nothing new is started and the journal is kept so the run can be resumed
+        self.cancel_event.set()
+        self.unpaused_event.set()
+
+    def set_paused(self, paused):
+        if paused:
+            self.unpaused_event.clear()
+        else:
+            self.unpaused_event.set()
+
+    def checkpoint(self):
+        # Wait here while paused, then tell the caller whether to stop
+        self.unpaused_event.wait()
+        return self.cancel_event.is_set()
+
+    def scan_music_folder(self, extensions, scan_queue):
+        # A resumed run replays the songs found by the interrupted run instead of scanning again
+        replaying = self.resume_paths is not None
+        # A dry run leaves the journal alone
+        journaling = not replaying and not self.dry_run
+        found_batch = []
+        try:
+            # Hand each path to the organizer as soon as it is found
+            for path_in_str in self.resume_paths if replaying else scan_music_files(self.info['selected_music_folder_path'], extensions):
+                if self.checkpoint():
+                    break
+                self.songs_found += 1
+                scan_queue.put(path_in_str)
+                # Journal the songs found in batches so a resumed run does not have to scan again
+                if journaling:
+                    found_batch.append(path_in_str)
+                # Update number of songs label with the songs found so far
+                if self.songs_found % self.scan_report_interval == 0:
+                    self.number_songs_signal.emit(self.songs_found, False)
+                    if found_batch:
+                        self.run_journal.record('found', paths=found_batch)
+                        found_batch = []
+
+            else:
+                # The journal only marks the scan finished if every song made it into the journal
+                if journaling:
+                    if found_batch:
+                        self.run_journal.record('found', paths=found_batch)
+                    self.run_journal.record('scan finished')
+        finally:
+            # Update number of songs label with the final count and mark the end of the scan
+            self.scan_finished = True
+            self.number_songs_signal.emit(self.songs_found, True)
+            scan_queue.put(None)
+
+    def submit_shard(self, tag_pool, shard):
+        # Read the tags of every song in the shard with one worker task
+        return (shard, tag_pool.submit(read_music_tags_batch, [path_in_str for path_in_str, stat_key in shard]), False)
+
+    def plan_shard(self, shard, tags_future, from_cache, recall_files):
+        try:
+            shard_tags = tags_future.result()
+        except Exception as e:
+            # A worker that crashed fails every song in its shard
+            shard_tags = [blank_music_tags(str(e)) for song in shard]
+
+        for (path_in_str, stat_key), tags in zip(shard, shard_tags):
+            # Save freshly read tags for the next run, a read that failed (a NAS I/O error) is tried again instead
+            if self.tag_cache and stat_key and not from_cache and tags['error'] in ('', missing_tags_error):
+                self.tag_cache.put(path_in_str, *stat_key, tags)
+            self.plan_song(path_in_str, stat_key, tags, recall_files)
+
+    def update_progress(self, size=0):
+        self.progress_tracker.advance(1, size)
+
+        # Progress is coalesced here, the songs in between are still counted in the next update
+        if time.monotonic() - self.last_progress_time >= self.progress_interval:
+            self.emit_progress()
+
+    def emit_progress(self):
+        self.last_progress_time = time.monotonic()
+        if self.progress_tracker.phase == 'planning':
+            # Planning is measured against the songs found so far
+            self.progress_tracker.files_total = self.songs_found
+            self.progress_tracker.total_final = self.scan_finished
+        self.music_progress_signal.emit(self.progress_tracker.percent())
+        self.progress_stats_signal.emit(self.progress_tracker.snapshot())
+
+    def plan_song(self, path_in_str, stat_key, tags, recall_files):
+        # Get file name from path
+        file_name = path_in_str.split("/")[-1]
+
+        try:
+            # Tag reading errors are raised here so they are recorded with the other errors
+            if tags['error']:
+                raise Exception(tags['error'])
+
+            # Remove unwanted characters and whitespace, and make the names valid folder names on every platform
+            artist = sanitize_path_component(tags['artist'])
+            album = sanitize_path_component(tags['album'])
+
+            # Construct new location
+            new_location = f"{self.info['selected_destination_folder_path']}/{artist}/{album}"
+
+            # Check if the file already exists in the new location
+            if self.destination_index.contains(new_location, file_name):
+                if files_identical(path_in_str, f"{new_location}/{file_name}", self.tag_cache):
+                    # The same song is already there, skip it without asking
+                    self.plan.append(PlanEntry('skip identical', path_in_str, new_location, stat_key=stat_key))
+                else:
+                    # The plan entry is also what the Replace or Skip window lists
+                    conflict_entry = PlanEntry('conflict', path_in_str, new_location, 'File already exists in the destination folder', stat_key)
+                    recall_files['replace_skip_files'].append(conflict_entry)
+                    self.plan.append(conflict_entry)
+            else:
+                # Claim the name now so a later song with the same name becomes a conflict
+                self.destination_index.add(new_location, file_name)
+                self.plan.append(PlanEntry('place', path_in_str, new_location, stat_key=stat_key))
+
+        except Exception as e:
+            self.record_error(path_in_str, tags, str(e), recall_files)
+            self.plan.append(PlanEntry('error', path_in_str, conflict=str(e)))
+
+        finally:
+            self.update_progress()
+
+    def record_error(self, path_in_str, tags, error, recall_files):
+        recall_files['error_files'].append(ErrorRecord(path_in_str, error, tags['artist_found'], tags['album_found'], tags['metadata_dict']))
+
+    def execute_plan(self, recall_files):
+        # Each entry's destination was settled by the planner, so entries can be carried out in any order
+        placement_mode = self.info.get('placement_mode', 'copy')
+
+        # Journal the whole plan before any of it is carried out
+        for entry in self.plan:
+            if entry.action == 'place':
+                self.run_journal.record('planned', entry.source, entry.destination, flush=False)
+            elif entry.action == 'skip identical':
+                # Nothing to copy, but the next run can still skip the song while it is unchanged
+                self.run_journal.record('completed', entry.source, entry.destination, flush=False)
+                self.run_manifest.record(entry.source, entry.stat_key, entry.destination)
+
+        # Place songs on several copy workers, as many at once as each source and destination device allows
+        placements = [entry for entry in self.plan if entry.action == 'place']
+
+        # Progress now follows the bytes placed, so a long song moves the bar further than a short one
+        self.progress_tracker.start_phase('placing', len(placements), sum(entry.stat_key[0] for entry in placements if entry.stat_key))
+        if placements:
+            self.emit_progress()
+        for entry, placement_future in self.copy_scheduler.run(placements, lambda entry: self.place_entry(entry, placement_mode), self.checkpoint):
+            try:
+                placement_method = placement_future.result()
+                self.placement_methods_used[placement_method] = self.placement_methods_used.get(placement_method, 0) + 1
+
+                # Remember the song so the next run can skip it while it is unchanged
+                self.run_manifest.record(entry.source, entry.stat_key, entry.destination)
+
+            except Exception as e:
+                # Plan entries don't keep tags, read them again for the few songs that fail to be placed
+                self.record_error(entry.source, read_music_tags(entry.source), str(e), recall_files)
+
+            finally:
+                self.update_progress(entry.stat_key[0] if entry.stat_key else 0)
+
+        # The last placement always reaches the window, and a plan with nothing to place still fills the bar
+        self.emit_progress()
+
+    def place_entry(self, entry, placement_mode):
+        # Runs on a copy worker: create directory and copy file to new location
+        folder_cache.make_folders(entry.destination_folder)
+        return place_file(entry.source, entry.destination, placement_mode, run_journal=self.run_journal, fsync_batch=self.fsync_batch)
+
     def run(self):
         # Future Reference | These file types did not work when tested with v2.07: aac, ac3, adts, mp1, ofr, ofs, tta, wv
         extensions = [".aif", ".aiff", ".ape", ".flac", ".m4a", ".m4b", ".m4r", ".mp2", ".mp3", ".mp4", ".mpc", ".ogg", ".opus", ".wav", ".wma"]
 
-        # Generate list of paths to music files
-        pathlist = []
-        for extension in extensions:
-            pathlist.extend(list(Path(self.info['selected_music_folder_path']).glob(f"**/*{extension}")))
-
-        # Update number of songs label
-        total_number_of_songs = len(pathlist)
-        self.number_songs_signal.emit(total_number_of_songs)
-
-        # Define the artist and album values to search for
-        artist_values = ['©art', 'artist', 'author', 'tpe1']
-        album_values = ['©alb', 'album', 'talb', 'wm/albumtitle']
-
-        # Check if folder has any songs
-        if total_number_of_songs:
-
-            # Initialize a dictionary to store file info for songs with errors
-            recall_files = {
-                'error_files': [],
-                'replace_skip_files': []
-            }
-
-            # Dont include replace_skip_files in progress bar
-            i = 0
-
-            # Loop through each song and organize it
-            for path in pathlist:
-                # Replace backslashes with forward slashes
-                path_in_str = str(path).replace('\\', '/')
-                # Get file name from path
-                file_name = path_in_str.split("/")[-1]
-
-                # Reset variables
-                artist_data = ''
-                album_data = ''
-                metadata_dict = {}
-                file_info = {}
-
-                try:
-                    # Load and extract metadata from the music file
-                    metadata = mutagen.File(path_in_str)
-
-                    # Iterate over the metadata items and add them to the dictionary
-                    for key, value in metadata.items():
-                        metadata_dict[key] = value
-
-                    # Loop through the metadata to find matching artist and album values
-                    for key, value in metadata.items():
-                        lowercase_key = key.lower()
-                        if lowercase_key in artist_values:
-                            artist_data = value
-                        elif lowercase_key in album_values:
-                            album_data = value
-
-                    # Check if artist_data and album_data were found
-                    if artist_data == '' or album_data == '':
-                        raise Exception("Artist or album data not found")
-
-                    # Convert the metadata values to strings
-                    artist = str(artist_data[0]) if isinstance(artist_data[0], ASFUnicodeAttribute) else artist_data[0]
-                    album = str(album_data[0]) if isinstance(album_data[0], ASFUnicodeAttribute) else album_data[0]
-
-                    # Remove unwanted characters and whitespace
-                    artist = artist.translate(str.maketrans("", "", ':*?<>|')).replace('/', '').replace('\\', '').replace('"', '').replace("'", '').replace('...', '').strip()
-                    album = album.translate(str.maketrans("", "", ':*?<>|')).replace('/', '').replace('\\', '').replace('"', '').replace("'", '').replace('...', '').strip()
-
-                    # Construct new location
-                    new_location = f"{self.info['selected_destination_folder_path']}/{artist}/{album}"
-
-                    # Check if the file already exists in the new location
-                    if Path(f"{new_location}/{file_name}").exists():
-                        file_info = {
-                            'file_name': file_name,
-                            'new_location': new_location,
-                            'path_in_str': path_in_str,
-                            'error': 'File already exists in the destination folder'
-                        }
-
-                        recall_files['replace_skip_files'].append(file_info)
-                    else:
-                        # Create directory and copy file to new location
-                        Path(new_location).mkdir(parents=True, exist_ok=True)
-                        shutil.copy(path_in_str, f"{new_location}/{file_name}")
-
-                except Exception as e:
-                    file_info = {
-                        'file_name': file_name,
-                        'artist_found': artist_data,
-                        'album_found': album_data,
-                        'metadata_dict': metadata_dict,
-                        'error': str(e)
-                    }
-
-                    recall_files['error_files'].append(file_info)
-
-                finally:
-                    # Update progress bar if no error or 'File already exists'
-                    if not file_info.get('error') or file_info.get('error') != 'File already exists in the destination folder':
-                        i += 1
-                        self.music_progress_signal.emit(int(i / len(pathlist) * 100))
+        # Initialize a dictionary to store file info for songs with errors
+        recall_files = {
+            'error_files': [],
+            'replace_skip_files': [],
+            'run_stats': {}
+        }
+
+        # Open the tag cache so unchanged songs skip mutagen entirely
+        self.tag_cache = TagCache() if self.info.get('tag_cache_enabled', True) else None
+
+        # Load the manifest of songs organized by previous runs into this destination
+        self.run_manifest = RunManifest(self.info['selected_destination_folder_path'])
+
+        # Start this run with an empty folder cache
+        folder_cache.reset()
+
+        self.run_journal = RunJournal(self.info['selected_destination_folder_path'])
+        try:
+            if not self.dry_run:
+                # Finish or roll back placements left half done by an interrupted run before anything new is placed
+                journal_state = self.run_journal.load()
+                placements_reconciled = reconcile_interrupted_placements(self.run_journal, journal_state['unfinished'])
+                if placements_reconciled:
+                    recall_files['run_stats']['Interrupted placements reconciled'] = placements_reconciled
+                    # Moves finished by the reconcile now count as completed
+                    journal_state = self.run_journal.load()
+
+                # Resume the interrupted run from its journal, or start a new journal
+                if self.info.get('resume', False) and self.run_journal.resumable_run(self.info['selected_music_folder_path']):
+                    self.completed_sources = journal_state['completed']
+                    if journal_state['scan_finished']:
+                        self.resume_paths = journal_state['found']
+                else:
+                    self.run_journal.start_run(self.info['selected_music_folder_path'])
+        except OSError as e:
+            # A destination that can't be written (read-only share, no permission, a file in the path) can't hold a journal
+            self.run_journal.close()
+            if self.tag_cache:
+                self.tag_cache.close()
+            self.custom_dialog_signal.emit(f'The destination folder could not be written to:\n{e}')
+            # Kill OrganizeThread QThread so the window is enabled again
+            self.kill_thread_signal.emit('organize')
+            return
+
+        try:
+            # Phase one: decide what to do with every song without touching the destination folder
+            self.plan_songs(extensions, recall_files)
+
+            if self.dry_run:
+                # Hand the plan back for export instead of carrying it out
+                recall_files['plan'] = self.plan
+            elif not self.cancel_event.is_set():
+                # Phase two: carry out the plan (a run cancelled while planning has nothing to carry out)
+                self.execute_plan(recall_files)
+
+                # Sync the last batch before the journal that could undo it is removed
+                self.fsync_batch.flush()
+
+                # The run is complete, so the journal is no longer needed (a cancelled run keeps it to be resumed)
+                if not self.cancel_event.is_set():
+                    self.run_journal.finish()
 
+            # Report what was done before a cancel, the windows after the run use the key to keep the journal
+            if self.cancel_event.is_set():
+                recall_files['cancelled'] = True
+                recall_files['run_stats']['Run cancelled'] = 'the plan is incomplete' if self.dry_run else 'use Resume Interrupted Run to finish it'
+
+            # Add the plan, placement methods, destination index and tag cache statistics to the run summary
+            planned_actions = plan_summary(self.plan)
+            for placement_method, songs_placed in self.placement_methods_used.items():
+                recall_files['run_stats'][f'Placed with {placement_method}'] = songs_placed
+            if self.dry_run:
+                recall_files['run_stats']['Songs to place'] = planned_actions.get('place', 0)
+                recall_files['run_stats']['Songs with a conflict'] = planned_actions.get('conflict', 0)
+                recall_files['run_stats']['Songs with an error'] = planned_actions.get('error', 0)
+            recall_files['run_stats']['Identical songs skipped'] = planned_actions.get('skip identical', 0)
+            recall_files['run_stats']['Destination stat calls avoided'] = self.destination_index.stat_calls_avoided()
+            recall_files['run_stats']['Folder mkdir calls (without cache)'] = folder_cache.folder_requests
+            recall_files['run_stats']['Folder mkdir calls (with cache)'] = folder_cache.mkdir_calls
+            for (role, device), (megabytes, megabytes_per_second) in self.copy_scheduler.throughput().items():
+                recall_files['run_stats'][f"{'Read from' if role == 'read' else 'Written to'} {device}"] = f"{megabytes:.1f} MB at {megabytes_per_second:.1f} MB/s"
+            if self.fsync_batch.fsync_mode != 'none':
+                recall_files['run_stats']['fsync calls'] = self.fsync_batch.fsync_calls
+            if self.info.get('skip_unchanged_songs', True):
+                recall_files['run_stats']['Unchanged songs skipped'] = planned_actions.get('skip unchanged', 0)
+            if 'skip placed' in planned_actions:
+                recall_files['run_stats']['Songs already placed before the interruption'] = planned_actions['skip placed']
+            if self.tag_cache:
+                recall_files['run_stats']['Tag cache hits'] = self.tag_cache.hits
+                recall_files['run_stats']['Tag cache misses'] = self.tag_cache.misses
+                recall_files['run_stats']['Tag cache invalidations'] = self.tag_cache.invalidations
+        finally:
+            self.run_journal.close()
+            if not self.dry_run:
+                self.run_manifest.save()
+            if self.tag_cache:
+                self.tag_cache.close()
+
+        # Check if folder had any songs (a cancelled run reports whatever it got to)
+        if self.songs_found or self.cancel_event.is_set():
             # Send recall_files
             self.organize_finish_signal.emit(recall_files)
 
@@ -132,3 +373,86 @@ class OrganizeThread(QThread):
             self.custom_dialog_signal.emit('No songs were found in the selected folder.')
             # Kill OrganizeThread QThread
             self.kill_thread_signal.emit('organize')
+
+    def plan_songs(self, extensions, recall_files):
+        # Read tags for several songs at once with worker threads, or with worker processes when parsing is CPU bound
+        if self.info.get('tag_reader_mode', 'threads') == 'processes':
+            tag_workers = os.cpu_count() or 1
+            # Workers are spawned, forking a process that runs Qt and the scan thread can deadlock the child on a lock held at fork time
+            tag_pool = ProcessPoolExecutor(max_workers=tag_workers, mp_context=multiprocessing.get_context('spawn'))
+            shard_size = self.process_shard_size
+        else:
+            tag_workers = max(1, int(self.info.get('tag_reader_threads', 8)))
+            tag_pool = ThreadPoolExecutor(max_workers=tag_workers)
+            shard_size = 1
+
+        # Keep enough shards in flight to hide network latency and keep every worker busy
+        shards_in_flight = tag_workers * 2
+        skip_unchanged = self.info.get('skip_unchanged_songs', True)
+
+        # Scan the music folder in the background and plan paths while they are still being found
+        scan_queue = queue.Queue(maxsize=self.scan_queue_size)
+        scan_thread = threading.Thread(target=self.scan_music_folder, args=(extensions, scan_queue), daemon=True)
+        scan_thread.start()
+
+        with tag_pool:
+            # Shards are planned in scan order so the plan and recall_files do not depend on which tag read finishes first
+            pending_shards = deque()
+            shard = []
+
+            # Loop through each song as the scan finds it and plan it
+            for path_in_str in iter(scan_queue.get, None):
+                if self.checkpoint():
+                    # Empty what the scan already queued so it is never left blocked, it stops at its next song
+                    for path_in_str in iter(scan_queue.get, None):
+                        pass
+                    break
+
+                # Skip songs the interrupted run already placed, without reading their tags again
+                if path_in_str in self.completed_sources:
+                    self.plan.append(PlanEntry('skip placed', path_in_str))
+                    self.update_progress()
+                    continue
+
+                stat_key = file_stat_key(path_in_str)
+
+                # Skip songs organized by a previous run that have not changed since
+                if skip_unchanged and self.run_manifest.is_unchanged(path_in_str, stat_key):
+                    self.plan.append(PlanEntry('skip unchanged', path_in_str, self.run_manifest.destination(path_in_str).rpartition('/')[0], stat_key=stat_key))
+                    self.update_progress()
+                    continue
+
+                cached_tags = self.tag_cache.get(path_in_str, *stat_key) if self.tag_cache and stat_key else None
+
+                if cached_tags is not None:
+                    # Send the songs found before this one first so scan order is kept
+                    if shard:
+                        pending_shards.append(self.submit_shard(tag_pool, shard))
+                        shard = []
+                    cached_future = Future()
+                    cached_future.set_result([cached_tags])
+                    pending_shards.append(([(path_in_str, stat_key)], cached_future, True))
+                else:
+                    shard.append((path_in_str, stat_key))
+                    if len(shard) >= shard_size:
+                        pending_shards.append(self.submit_shard(tag_pool, shard))
+                        shard = []
+
+                while len(pending_shards) >= shards_in_flight:
+                    self.plan_shard(*pending_shards.popleft(), recall_files)
+
+            if self.cancel_event.is_set():
+                # Drop the tag reads that have not started, the running ones finish when the pool closes
+                for shard, tags_future, from_cache in pending_shards:
+                    tags_future.cancel()
+            else:
+                # Send the last partial shard
+                if shard:
+                    pending_shards.append(self.submit_shard(tag_pool, shard))
+
+                # Plan the songs still waiting on their tags
+                while pending_shards:
+                    self.plan_shard(*pending_shards.popleft(), recall_files)
+
+        # Show where planning ended, whatever the last coalesced update showed
+        self.emit_progress()
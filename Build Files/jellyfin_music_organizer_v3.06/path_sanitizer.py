@@ -0,0 +1,34 @@
+from functools import lru_cache
+
+# Characters removed from artist and album folder names: the ones Windows doesn't allow in a name
+# (/ and NUL aren't allowed anywhere), quotes, and control characters
+removed_characters = ':*?<>|/\\"\'' + ''.join(map(chr, range(32)))
+sanitize_table = str.maketrans('', '', removed_characters)
+
+# Device names Windows reserves in every folder, with or without an extension
+windows_reserved_names = {'CON', 'PRN', 'AUX', 'NUL'} | {f"{device}{number}" for device in ('COM', 'LPT') for number in range(1, 10)}
+
+# Longest name most filesystems accept (ext4, btrfs, and NTFS for ASCII names), in UTF-8 bytes
+max_name_bytes = 255
+
+@lru_cache(maxsize=65536)
+def sanitize_path_component(tag_value):
+    # Artist or album tag -> a folder name that works on Linux, macOS and Windows.
+    # Libraries repeat the same artists and albums thousands of times, so each value is only cleaned once
+    name = tag_value.translate(sanitize_table).replace('...', '').strip()
+
+    # Windows reserves the device name as the part before the first dot, so "nul.album" becomes "nul_.album"
+    stem, dot, extension = name.partition('.')
+    device_name = stem.rstrip(' ')
+    if device_name.upper() in windows_reserved_names:
+        name = f"{device_name}_{stem[len(device_name):]}{dot}{extension}"
+
+    # Cut long names on a character boundary (the device name stays whole, it is at the start)
+    if len(name.encode('utf-8')) > max_name_bytes:
+        name = name.encode('utf-8')[:max_name_bytes].decode('utf-8', 'ignore')
+
+    # Windows drops trailing dots and spaces, so "Vol. 1." and "Vol. 1" would be the same folder there
+    name = name.rstrip('. ')
+
+    # A tag with nothing left ('...', spaces) would make an empty folder name and merge into its parent
+    return name or '_'
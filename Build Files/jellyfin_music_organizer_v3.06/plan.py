@@ -0,0 +1,24 @@
+import csv
+import json
+
+# Columns written when a plan is exported
+plan_columns = ['action', 'source', 'destination', 'conflict']
+
+def plan_summary(plan):
+    # Number of songs for each action, in the order the actions first appear
+    summary = {}
+    for entry in plan:
+        summary[entry.action] = summary.get(entry.action, 0) + 1
+    return summary
+
+def export_plan(plan, export_path):
+    # Export as CSV for spreadsheets or JSON for scripts, picked by the file extension
+    rows = ({column: getattr(entry, column) for column in plan_columns} for entry in plan)
+    if export_path.lower().endswith('.csv'):
+        with open(export_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=plan_columns)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(export_path, 'w', encoding='utf-8') as f:
+            json.dump(list(rows), f, indent=1)
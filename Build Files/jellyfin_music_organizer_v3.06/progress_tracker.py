@@ -0,0 +1,107 @@
+from collections import deque
+import time
+
+def format_bytes(size):
+    # Human readable size for the progress label
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+class ProgressTracker:
+    # Rates are averaged over this many recent seconds so they follow the current speed, not the whole run's
+    window_seconds = 5.0
+
+    def __init__(self, planning_share=10):
+        # Percent of the bar filled by planning, placing fills the rest (a dry run only plans, so it gets the whole bar)
+        self.planning_share = planning_share
+        self.start_phase('planning', 0, 0)
+
+    def start_phase(self, phase, files_total, bytes_total):
+        # 'planning' counts songs planned, 'placing' counts songs and bytes placed
+        self.phase = phase
+        self.files_total = files_total
+        self.bytes_total = bytes_total
+        self.files_done = 0
+        self.bytes_done = 0
+
+        # Whether files_total is final, it keeps growing while the scan is still finding songs
+        self.total_final = phase != 'planning'
+
+        # (time, files done, bytes done) samples inside the averaging window
+        self.samples = deque([(time.monotonic(), 0, 0)])
+
+    def advance(self, files=1, size=0):
+        self.files_done += files
+        self.bytes_done += size
+        now = time.monotonic()
+        self.samples.append((now, self.files_done, self.bytes_done))
+        # Keep one sample older than the window so the average always spans it
+        while len(self.samples) > 2 and now - self.samples[1][0] > self.window_seconds:
+            self.samples.popleft()
+
+    def rates(self):
+        # Moving average of files and bytes per second
+        (first_time, first_files, first_bytes), (last_time, last_files, last_bytes) = self.samples[0], self.samples[-1]
+        elapsed = last_time - first_time
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (last_files - first_files) / elapsed, (last_bytes - first_bytes) / elapsed
+
+    def phase_fraction(self):
+        # Bytes when they are known (big songs weigh more than small ones), songs otherwise
+        if self.bytes_total:
+            return self.bytes_done / self.bytes_total
+        if self.files_total:
+            return self.files_done / self.files_total
+        # Nothing found yet has not started planning, nothing to place has finished placing
+        return 0.0 if self.phase == 'planning' else 1.0
+
+    def percent(self):
+        # One bar for the whole run, so it never goes back when placing starts
+        if self.phase == 'planning':
+            progress = int(self.phase_fraction() * self.planning_share)
+            # The scan may still find songs, so planning is only complete once its total is final
+            return progress if self.total_final else min(progress, self.planning_share - 1)
+        return self.planning_share + int(self.phase_fraction() * (100 - self.planning_share))
+
+    def snapshot(self):
+        files_per_second, bytes_per_second = self.rates()
+
+        # Time left at the current speed, by bytes when they are known
+        if not self.total_final:
+            eta_seconds = None
+        elif self.bytes_total and bytes_per_second:
+            eta_seconds = (self.bytes_total - self.bytes_done) / bytes_per_second
+        elif self.files_total and files_per_second:
+            eta_seconds = (self.files_total - self.files_done) / files_per_second
+        else:
+            eta_seconds = None
+
+        return {
+            'phase': self.phase,
+            'files_done': self.files_done,
+            'files_total': self.files_total,
+            'bytes_done': self.bytes_done,
+            'bytes_total': self.bytes_total,
+            'files_per_second': files_per_second,
+            'bytes_per_second': bytes_per_second,
+            'eta_seconds': eta_seconds
+        }
+
+def describe_progress(snapshot):
+    # One line for the label next to the progress bar
+    if snapshot['phase'] == 'planning':
+        text = f"Planning: {snapshot['files_done']} of {snapshot['files_total']} songs, {snapshot['files_per_second']:.0f} songs/s"
+    else:
+        text = (f"Placing: {format_bytes(snapshot['bytes_done'])} of {format_bytes(snapshot['bytes_total'])}, "
+                f"{snapshot['bytes_per_second'] / 1024 / 1024:.1f} MB/s, {snapshot['files_per_second']:.0f} songs/s")
+    if snapshot['eta_seconds'] is not None:
+        text += f", ETA {format_duration(snapshot['eta_seconds'])}"
+    return text
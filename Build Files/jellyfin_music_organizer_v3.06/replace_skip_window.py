@@ -3,14 +3,21 @@ from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                             QProgressBar)
 from PyQt5.QtCore import pyqtSignal, Qt
 from PyQt5.QtGui import QIcon
-from pathlib import Path
-import shutil
+
+# Other classes within files
+from run_manifest import RunManifest
+from run_journal import RunJournal
+from music_scanner import file_stat_key
+from copy_engine import place_file
+from io_throttle import io_throttle
+from folder_cache import folder_cache
+from fsync_batch import FsyncBatch
 
 class ReplaceSkipWindow(QWidget):
     windowOpened = pyqtSignal(bool)
     windowClosed = pyqtSignal(bool)
 
-    def __init__(self, replace_skip_files):
+    def __init__(self, replace_skip_files, destination_folder_path, placement_mode='copy', fsync_mode='none', keep_journal=False):
         super().__init__()
 
         # Version Control
@@ -19,6 +26,20 @@ class ReplaceSkipWindow(QWidget):
         self.replace_skip_files = replace_skip_files
         self.total_entries = len(self.replace_skip_files)
 
+        # Replaced songs are copied or linked the same way OrganizeThread placed the others
+        self.placement_mode = placement_mode
+
+        # Replaced songs are synced to disk the same way too
+        self.fsync_batch = FsyncBatch(fsync_mode)
+
+        # Replaced songs are added to the run manifest so the next run skips them
+        self.run_manifest = RunManifest(destination_folder_path)
+
+        # Replaced songs are journaled like the ones OrganizeThread placed
+        self.run_journal = RunJournal(destination_folder_path)
+        # A cancelled run's journal is kept so the run can still be resumed
+        self.keep_journal = keep_journal
+
         # Setup and show user interface
         self.setup_ui()
 
@@ -28,6 +49,12 @@ class ReplaceSkipWindow(QWidget):
         self.center_window()
 
     def closeEvent(self, event):
+        self.fsync_batch.flush()
+        self.run_manifest.save()
+        if self.keep_journal:
+            self.run_journal.close()
+        else:
+            self.run_journal.finish()
         self.windowClosed.emit(True)
         super().closeEvent(event)
 
@@ -151,9 +178,9 @@ class ReplaceSkipWindow(QWidget):
         self.move(x, y)
 
     def populate_list_widget(self):
-        # Add each entry's 'file_name' to QListWidget
+        # Add each entry's file name to QListWidget
         for entry in self.replace_skip_files:
-            self.list_widget.addItem(entry['file_name'])
+            self.list_widget.addItem(entry.file_name)
 
         # Set the initial selected item in QListWidget
         self.list_widget.setCurrentRow(0)
@@ -163,16 +190,16 @@ class ReplaceSkipWindow(QWidget):
         if selected_item:
             selected_file = selected_item.text()
             selected_entry = next(
-                (entry for entry in self.replace_skip_files if entry['file_name'] == selected_file), None)
+                (entry for entry in self.replace_skip_files if entry.file_name == selected_file), None)
             if selected_entry:
-                self.label.setText(f"The destination:\n{selected_entry['new_location']}\nAlready has a file named:\n{selected_entry['file_name']}")
+                self.label.setText(f"The destination:\n{selected_entry.destination_folder}\nAlready has a file named:\n{selected_entry.file_name}")
         else:
             self.label.clear()
 
     def skip_file(self):
         selected_file = self.list_widget.currentItem().text()
         selected_entry = next(
-            (entry for entry in self.replace_skip_files if entry['file_name'] == selected_file), None)
+            (entry for entry in self.replace_skip_files if entry.file_name == selected_file), None)
         if selected_entry:
             self.replace_skip_files.remove(selected_entry)
             self.list_widget.takeItem(self.list_widget.currentRow())
@@ -198,7 +225,7 @@ class ReplaceSkipWindow(QWidget):
     def replace_file(self):
         selected_file = self.list_widget.currentItem().text()
         selected_entry = next(
-            (entry for entry in self.replace_skip_files if entry['file_name'] == selected_file), None)
+            (entry for entry in self.replace_skip_files if entry.file_name == selected_file), None)
         if selected_entry:
             self.replace_file_action(selected_entry)
             self.skip_file()
@@ -207,17 +234,18 @@ class ReplaceSkipWindow(QWidget):
         while self.list_widget.count() > 0:
             selected_file = self.list_widget.item(0).text()
             selected_entry = next(
-                (entry for entry in self.replace_skip_files if entry['file_name'] == selected_file), None)
+                (entry for entry in self.replace_skip_files if entry.file_name == selected_file), None)
             if selected_entry:
                 self.replace_file_action(selected_entry)
                 self.skip_file()
 
     def replace_file_action(self, entry):
-        new_location = entry['new_location']
-        file_name = entry['file_name']
-        path_in_str = entry['path_in_str']
+        folder_cache.make_folders(entry.destination_folder)
+        # This runs on the GUI thread, so the copy speed limits would freeze the window
+        with io_throttle.unthrottled():
+            place_file(entry.source, entry.destination, self.placement_mode, replace=True, run_journal=self.run_journal, fsync_batch=self.fsync_batch)
 
-        Path(new_location).mkdir(parents=True, exist_ok=True)
-        shutil.copy(path_in_str, f"{new_location}/{file_name}")
+        # Remember the song so the next run can skip it while it is unchanged
+        self.run_manifest.record(entry.source, file_stat_key(entry.source), entry.destination)
 
 
@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+
+class RunJournal:
+    def __init__(self, destination_folder_path):
+        # The journal lives in the destination folder next to the run manifest
+        self.journal_path = f"{destination_folder_path}/journal_jmo.jsonl"
+        self.journal_file = None
+
+        # The scan thread and the organizer both write to the journal
+        self.lock = threading.Lock()
+
+    def record(self, state, source_path='', destination_path='', flush=True, **details):
+        with self.lock:
+            # Open lazily so a window that never places a file doesn't create a journal
+            if self.journal_file is None:
+                self.journal_file = open(self.journal_path, 'a', encoding='utf-8')
+                # A crash may have cut the last line short, start a new line so the next entry can still be read
+                if self.journal_file.tell():
+                    with open(self.journal_path, 'rb') as f:
+                        f.seek(-1, os.SEEK_END)
+                        if f.read(1) != b'\n':
+                            self.journal_file.write('\n')
+
+            # One JSON line per event, flushed straight away (write-ahead) so it survives a crash
+            entry = {'state': state, 'source': source_path, 'destination': destination_path}
+            entry.update(details)
+            self.journal_file.write(json.dumps(entry) + '\n')
+            if flush:
+                self.journal_file.flush()
+
+    def start_run(self, music_folder_path):
+        # A new run replaces the journal of the previous one
+        self.close()
+        with self.lock:
+            # The destination folder may not have been created yet
+            os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+            self.journal_file = open(self.journal_path, 'w', encoding='utf-8')
+        self.record('run started', music_folder_path)
+
+    def resumable_run(self, music_folder_path):
+        # The journal is removed when a run finishes, so a journal that starts with this music folder was interrupted
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                entry = json.loads(f.readline())
+            return entry['state'] == 'run started' and entry['source'] == music_folder_path
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def load(self):
+        # Rebuild what the journaled run found, finished and left half done
+        journal_state = {
+            'found': {},
+            'scan_finished': False,
+            'completed': set(),
+            'unfinished': {}
+        }
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line may be cut short by a crash
+                        continue
+                    state = entry['state']
+                    key = (entry['source'], entry['destination'])
+                    if state == 'found':
+                        # Dictionary keys keep the scan order and drop songs found twice
+                        journal_state['found'].update(dict.fromkeys(entry['paths']))
+                    elif state == 'scan finished':
+                        journal_state['scan_finished'] = True
+                    elif state == 'started':
+                        journal_state['unfinished'][key] = (entry.get('placement_mode', 'copy'), entry.get('replace', False))
+                    elif state == 'completed':
+                        journal_state['unfinished'].pop(key, None)
+                        journal_state['completed'].add(entry['source'])
+                    elif state == 'rolled back':
+                        journal_state['unfinished'].pop(key, None)
+        except FileNotFoundError:
+            pass
+        journal_state['found'] = list(journal_state['found'])
+        return journal_state
+
+    def close(self):
+        with self.lock:
+            if self.journal_file is not None:
+                self.journal_file.close()
+                self.journal_file = None
+
+    def finish(self):
+        # Remove the journal once nothing in it is left half done
+        self.close()
+        if not self.load()['unfinished']:
+            try:
+                os.remove(self.journal_path)
+            except FileNotFoundError:
+                pass
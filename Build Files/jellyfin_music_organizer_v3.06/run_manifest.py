@@ -0,0 +1,50 @@
+import json
+import os
+
+class RunManifest:
+    def __init__(self, destination_folder_path):
+        # The manifest lives in the destination folder so it follows the library it describes
+        self.manifest_path = f"{destination_folder_path}/manifest_jmo.json"
+
+        # Source path -> [size, mtime_ns, destination path]
+        self.entries = {}
+        self.changed = False
+
+        # Load the manifest from the previous run if it exists
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            # A missing or unreadable manifest just means every song is organized again
+            self.entries = {}
+
+    def is_unchanged(self, path_in_str, stat_key):
+        # A song is unchanged if it was organized before with the same size and mtime
+        entry = self.entries.get(path_in_str)
+        return entry is not None and stat_key is not None and entry[0] == stat_key[0] and entry[1] == stat_key[1]
+
+    def destination(self, path_in_str):
+        # Where the song was organized to by the previous run
+        entry = self.entries.get(path_in_str)
+        return entry[2] if entry is not None else ''
+
+    def record(self, path_in_str, stat_key, destination_path):
+        if stat_key is None:
+            return
+        self.entries[path_in_str] = [stat_key[0], stat_key[1], destination_path]
+        self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+
+        # Write to a temporary file first so an interrupted save never leaves a truncated manifest
+        temporary_path = f"{self.manifest_path}.tmp"
+        try:
+            with open(temporary_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, separators=(',', ':'))
+            os.replace(temporary_path, self.manifest_path)
+            self.changed = False
+        except OSError:
+            # The manifest only speeds up the next run, so a read-only destination is not an error
+            pass
@@ -1,15 +1,22 @@
 from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                             QPushButton, QApplication, QSizeGrip, QCheckBox,
-                            QSpacerItem, QSizePolicy,QFrame, QFileDialog)
+                            QSpacerItem, QSizePolicy,QFrame, QFileDialog,
+                            QSpinBox, QComboBox)
 from PyQt5.QtCore import pyqtSignal, Qt, QTimer
 from PyQt5.QtGui import QIcon
 import json
+import sqlite3
+
+# Other classes within files
+from tag_cache import TagCache
+from io_throttle import io_throttle
 
 class SettingsWindow(QWidget):
     windowOpened = pyqtSignal(bool)
     windowClosed = pyqtSignal(bool)
+    custom_dialog_signal = pyqtSignal(str)
 
-    def __init__(self):
+    def __init__(self, run_in_progress=False):
         super().__init__()
 
         # Version Control
@@ -25,6 +32,10 @@ class SettingsWindow(QWidget):
         # Load settings from file if it exists
         self.load_settings()
 
+        # A run in progress holds the tag cache open, so it can't be cleared or compacted until the run ends
+        self.clear_cache_button.setEnabled(not run_in_progress)
+        self.compact_cache_button.setEnabled(not run_in_progress)
+
     def showEvent(self, event):
         self.windowOpened.emit(False)
         super().showEvent(event)
@@ -117,6 +128,146 @@ class SettingsWindow(QWidget):
         spacer_item = QSpacerItem(30, 20, QSizePolicy.Minimum, QSizePolicy.Expanding)
         vbox_main_layout.addItem(spacer_item)
 
+        # QLabel for performance
+        self.performance_label = QLabel(self)
+        self.performance_label.setText("Performance:")
+        vbox_main_layout.addWidget(self.performance_label)
+
+        # QHBoxLayout setup for tag reader threads
+        hbox_tag_threads_layout = QHBoxLayout()
+        vbox_main_layout.addLayout(hbox_tag_threads_layout)
+
+        # Create tag reader threads label and spin box
+        self.tag_threads_label = QLabel("Tag reader threads:")
+        hbox_tag_threads_layout.addWidget(self.tag_threads_label, 1)
+        self.tag_threads_spinbox = QSpinBox()
+        self.tag_threads_spinbox.setRange(1, 64)
+        self.tag_threads_spinbox.setValue(8)
+        self.tag_threads_spinbox.setToolTip('Number of songs whose tags are read at the same time')
+        hbox_tag_threads_layout.addWidget(self.tag_threads_spinbox)
+
+        # QHBoxLayout setup for tag reader mode
+        hbox_tag_mode_layout = QHBoxLayout()
+        vbox_main_layout.addLayout(hbox_tag_mode_layout)
+
+        # Create tag reader mode label and combo box
+        self.tag_mode_label = QLabel("Read tags with:")
+        hbox_tag_mode_layout.addWidget(self.tag_mode_label, 1)
+        self.tag_mode_combobox = QComboBox()
+        self.tag_mode_combobox.addItem("Threads", "threads")
+        self.tag_mode_combobox.addItem("Processes", "processes")
+        self.tag_mode_combobox.setToolTip('Threads suit network shares. Processes use one worker per CPU core and suit large local libraries')
+        hbox_tag_mode_layout.addWidget(self.tag_mode_combobox)
+
+        # QHBoxLayout setup for placement mode
+        hbox_placement_layout = QHBoxLayout()
+        vbox_main_layout.addLayout(hbox_placement_layout)
+
+        # Create placement mode label and combo box
+        self.placement_label = QLabel("Place songs by:")
+        hbox_placement_layout.addWidget(self.placement_label, 1)
+        self.placement_combobox = QComboBox()
+        self.placement_combobox.addItem("Copy", "copy")
+        self.placement_combobox.addItem("Hardlink", "hardlink")
+        self.placement_combobox.addItem("Reflink (copy-on-write)", "reflink")
+        self.placement_combobox.addItem("Symlink", "symlink")
+        self.placement_combobox.addItem("Move", "move")
+        self.placement_combobox.setToolTip('Links are only made when the music and destination folders are on the same drive, otherwise songs are copied.\n'
+                                           'Move removes songs from the music folder once they are in the destination folder')
+        hbox_placement_layout.addWidget(self.placement_combobox)
+
+        # QHBoxLayout setup for copy workers
+        hbox_copy_workers_layout = QHBoxLayout()
+        vbox_main_layout.addLayout(hbox_copy_workers_layout)
+
+        # Create copy workers label and spin box
+        self.copy_workers_label = QLabel("Copy workers:")
+        hbox_copy_workers_layout.addWidget(self.copy_workers_label, 1)
+        self.copy_workers_spinbox = QSpinBox()
+        self.copy_workers_spinbox.setRange(1, 32)
+        self.copy_workers_spinbox.setValue(8)
+        self.copy_workers_spinbox.setToolTip('Most songs placed at the same time. Each drive is also limited by its kind:\n'
+                                             '8 for SSDs, 2 for spinning disks and 4 for network shares')
+        hbox_copy_workers_layout.addWidget(self.copy_workers_spinbox)
+
+        # QHBoxLayout setup for copy speed limit
+        hbox_throttle_bytes_layout = QHBoxLayout()
+        vbox_main_layout.addLayout(hbox_throttle_bytes_layout)
+
+        # Create copy speed limit label and spin box
+        self.throttle_bytes_label = QLabel("Copy speed limit (MB/s, 0 = unlimited):")
+        hbox_throttle_bytes_layout.addWidget(self.throttle_bytes_label, 1)
+        self.throttle_bytes_spinbox = QSpinBox()
+        self.throttle_bytes_spinbox.setRange(0, 10000)
+        self.throttle_bytes_spinbox.setValue(0)
+        self.throttle_bytes_spinbox.setToolTip('Keeps Jellyfin playback smooth while songs are copied into the library drive.\n'
+                                               'Saving the settings changes the limit of a run in progress')
+        hbox_throttle_bytes_layout.addWidget(self.throttle_bytes_spinbox)
+
+        # QHBoxLayout setup for files per second limit
+        hbox_throttle_files_layout = QHBoxLayout()
+        vbox_main_layout.addLayout(hbox_throttle_files_layout)
+
+        # Create files per second limit label and spin box
+        self.throttle_files_label = QLabel("Files per second limit (0 = unlimited):")
+        hbox_throttle_files_layout.addWidget(self.throttle_files_label, 1)
+        self.throttle_files_spinbox = QSpinBox()
+        self.throttle_files_spinbox.setRange(0, 10000)
+        self.throttle_files_spinbox.setValue(0)
+        self.throttle_files_spinbox.setToolTip('Limits how many songs are placed each second, saving the settings changes the limit of a run in progress')
+        hbox_throttle_files_layout.addWidget(self.throttle_files_spinbox)
+
+        # Create the lower disk priority checkbox
+        self.low_io_priority_checkbox = QCheckBox("Lower disk priority while copying (Linux)")
+        self.low_io_priority_checkbox.setChecked(False)
+        self.low_io_priority_checkbox.setToolTip('Copy workers run at the lowest priority so other programs reading the drives go first')
+        vbox_main_layout.addWidget(self.low_io_priority_checkbox)
+
+        # QHBoxLayout setup for fsync mode
+        hbox_fsync_layout = QHBoxLayout()
+        vbox_main_layout.addLayout(hbox_fsync_layout)
+
+        # Create fsync mode label and combo box
+        self.fsync_label = QLabel("Sync to disk:")
+        hbox_fsync_layout.addWidget(self.fsync_label, 1)
+        self.fsync_combobox = QComboBox()
+        self.fsync_combobox.addItem("Never", "none")
+        self.fsync_combobox.addItem("After every song", "file")
+        self.fsync_combobox.addItem("In batches per album folder", "folder")
+        self.fsync_combobox.setToolTip('Songs are always written to a temporary name and renamed into place.\n'
+                                       'Syncing also keeps them safe from a power cut, batches are much faster than every song')
+        hbox_fsync_layout.addWidget(self.fsync_combobox)
+
+        # Create the tag cache checkbox
+        self.tag_cache_checkbox = QCheckBox("Cache tags and file hashes between runs")
+        self.tag_cache_checkbox.setChecked(True)
+        vbox_main_layout.addWidget(self.tag_cache_checkbox)
+
+        # Create the skip unchanged songs checkbox
+        self.skip_unchanged_checkbox = QCheckBox("Skip songs organized in a previous run")
+        self.skip_unchanged_checkbox.setChecked(True)
+        self.skip_unchanged_checkbox.setToolTip('Songs that have not changed since they were last organized into the destination folder are skipped')
+        vbox_main_layout.addWidget(self.skip_unchanged_checkbox)
+
+        # QHBoxLayout setup for clear and compact tag cache
+        hbox_tag_cache_layout = QHBoxLayout()
+        vbox_main_layout.addLayout(hbox_tag_cache_layout)
+
+        # Create clear tag cache button
+        self.clear_cache_button = QPushButton('Clear Tag Cache')
+        hbox_tag_cache_layout.addWidget(self.clear_cache_button, 1)
+        self.clear_cache_button.clicked.connect(self.clear_tag_cache)
+
+        # Create compact tag cache button
+        self.compact_cache_button = QPushButton('Compact Tag Cache')
+        self.compact_cache_button.setToolTip('Remove cached tags for files that no longer exist and shrink the cache file')
+        hbox_tag_cache_layout.addWidget(self.compact_cache_button, 1)
+        self.compact_cache_button.clicked.connect(self.compact_tag_cache)
+
+        # Add a spacer item to create an empty line
+        spacer_item = QSpacerItem(30, 20, QSizePolicy.Minimum, QSizePolicy.Expanding)
+        vbox_main_layout.addItem(spacer_item)
+
         # QLabel for music library
         self.music_label = QLabel(self)
         self.music_label.setText("Folders:")
@@ -221,6 +372,16 @@ class SettingsWindow(QWidget):
                 self.music_folder_path = self.settings.get("music_folder_path", "")
                 self.destination_folder_path = self.settings.get("destination_folder_path", "")
                 self.checkbox.setChecked(self.settings.get("mute_sound", False))
+                self.tag_threads_spinbox.setValue(self.settings.get("tag_reader_threads", 8))
+                self.tag_mode_combobox.setCurrentIndex(max(0, self.tag_mode_combobox.findData(self.settings.get("tag_reader_mode", "threads"))))
+                self.tag_cache_checkbox.setChecked(self.settings.get("tag_cache_enabled", True))
+                self.skip_unchanged_checkbox.setChecked(self.settings.get("skip_unchanged_songs", True))
+                self.placement_combobox.setCurrentIndex(max(0, self.placement_combobox.findData(self.settings.get("placement_mode", "copy"))))
+                self.fsync_combobox.setCurrentIndex(max(0, self.fsync_combobox.findData(self.settings.get("fsync_mode", "none"))))
+                self.copy_workers_spinbox.setValue(self.settings.get("copy_workers", 8))
+                self.throttle_bytes_spinbox.setValue(self.settings.get("throttle_megabytes_per_second", 0))
+                self.throttle_files_spinbox.setValue(self.settings.get("throttle_files_per_second", 0))
+                self.low_io_priority_checkbox.setChecked(self.settings.get("low_io_priority", False))
 
                 # Update the labels with the loaded values
                 self.music_folder_label.setText(self.music_folder_path)
@@ -234,9 +395,22 @@ class SettingsWindow(QWidget):
         settings = {
             "music_folder_path": self.music_folder_path,
             "destination_folder_path": self.destination_folder_path,
-            "mute_sound": self.checkbox.isChecked()
+            "mute_sound": self.checkbox.isChecked(),
+            "tag_reader_threads": self.tag_threads_spinbox.value(),
+            "tag_reader_mode": self.tag_mode_combobox.currentData(),
+            "tag_cache_enabled": self.tag_cache_checkbox.isChecked(),
+            "skip_unchanged_songs": self.skip_unchanged_checkbox.isChecked(),
+            "placement_mode": self.placement_combobox.currentData(),
+            "fsync_mode": self.fsync_combobox.currentData(),
+            "copy_workers": self.copy_workers_spinbox.value(),
+            "throttle_megabytes_per_second": self.throttle_bytes_spinbox.value(),
+            "throttle_files_per_second": self.throttle_files_spinbox.value(),
+            "low_io_priority": self.low_io_priority_checkbox.isChecked()
         }
 
+        # Apply the new limits straight away, also to a run in progress
+        io_throttle.set_limits(settings["throttle_megabytes_per_second"], settings["throttle_files_per_second"])
+
         # Save settings to file
         with open('settings_jmo.json', 'w') as file:
             json.dump(settings, file, indent=4)
@@ -266,6 +440,16 @@ class SettingsWindow(QWidget):
         self.music_folder_path = ''
         self.destination_folder_path = ''
         self.checkbox.setChecked(False)
+        self.tag_threads_spinbox.setValue(8)
+        self.tag_mode_combobox.setCurrentIndex(0)
+        self.tag_cache_checkbox.setChecked(True)
+        self.skip_unchanged_checkbox.setChecked(True)
+        self.placement_combobox.setCurrentIndex(0)
+        self.fsync_combobox.setCurrentIndex(0)
+        self.copy_workers_spinbox.setValue(8)
+        self.throttle_bytes_spinbox.setValue(0)
+        self.throttle_files_spinbox.setValue(0)
+        self.low_io_priority_checkbox.setChecked(False)
 
         # Reset settings to default
         self.music_folder_label.setText(self.music_folder_path)
@@ -294,4 +478,70 @@ class SettingsWindow(QWidget):
         self.reset_button.setText("Reset && Save All Settings")
         self.reset_button.setStyleSheet("")
 
+    def clear_tag_cache(self):
+        # Remove every cached tag entry
+        try:
+            tag_cache = TagCache()
+            try:
+                tag_cache.clear()
+            finally:
+                tag_cache.close()
+        except sqlite3.OperationalError:
+            # A run in progress holds the tag cache open for writing
+            self.custom_dialog_signal.emit('The tag cache is in use, try again when the run has finished.')
+            return
+
+        # Update the button text and color temporarily
+        self.clear_cache_button.setText("Success")
+        self.clear_cache_button.setStyleSheet("""
+            background-color: rgba(255, 152, 152, 1);
+            color: black;
+        """)
+
+        # Stop any existing clear cache timers before creating a new one
+        if hasattr(self, "reset_clear_cache_timer"):
+            self.reset_clear_cache_timer.stop()
+
+        # Create a new clear cache timer to reset the button text and color after 1 seconds
+        self.reset_clear_cache_timer = QTimer(self)
+        self.reset_clear_cache_timer.timeout.connect(self.resetClearCacheButton)
+        self.reset_clear_cache_timer.start(1000)
+
+    def resetClearCacheButton(self):
+        self.clear_cache_button.setText("Clear Tag Cache")
+        self.clear_cache_button.setStyleSheet("")
+
+    def compact_tag_cache(self):
+        # Remove cached tags for files that no longer exist
+        try:
+            tag_cache = TagCache()
+            try:
+                tag_cache.compact()
+            finally:
+                tag_cache.close()
+        except sqlite3.OperationalError:
+            # A run in progress holds the tag cache open for writing
+            self.custom_dialog_signal.emit('The tag cache is in use, try again when the run has finished.')
+            return
+
+        # Update the button text and color temporarily
+        self.compact_cache_button.setText("Success")
+        self.compact_cache_button.setStyleSheet("""
+            background-color: rgba(255, 152, 152, 1);
+            color: black;
+        """)
+
+        # Stop any existing compact cache timers before creating a new one
+        if hasattr(self, "reset_compact_cache_timer"):
+            self.reset_compact_cache_timer.stop()
+
+        # Create a new compact cache timer to reset the button text and color after 1 seconds
+        self.reset_compact_cache_timer = QTimer(self)
+        self.reset_compact_cache_timer.timeout.connect(self.resetCompactCacheButton)
+        self.reset_compact_cache_timer.start(1000)
+
+    def resetCompactCacheButton(self):
+        self.compact_cache_button.setText("Compact Tag Cache")
+        self.compact_cache_button.setStyleSheet("")
+
 
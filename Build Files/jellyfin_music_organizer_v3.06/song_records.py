@@ -0,0 +1,45 @@
+import sys
+
+# Records kept for every song of a run. Slots instead of a dict per song, and folder paths interned so
+# all the songs in a folder share one string, keep a run over hundreds of thousands of songs small
+
+def split_song_path(path_in_str):
+    # Folder (interned) and file name of a song path
+    folder_path, separator, file_name = path_in_str.rpartition('/')
+    return sys.intern(folder_path), file_name
+
+class PlanEntry:
+    # One song in the plan: what will be done with it, where it goes and why it can't be done if it can't.
+    # Conflicts are also the entries listed in the Replace or Skip window
+    __slots__ = ('action', 'source_folder', 'file_name', 'destination_folder', 'conflict', 'stat_key')
+
+    def __init__(self, action, source_path, destination_folder=None, conflict='', stat_key=None):
+        self.action = action
+        self.source_folder, self.file_name = split_song_path(source_path)
+        # Songs keep their file name, so only the album folder they go to is stored
+        self.destination_folder = sys.intern(destination_folder) if destination_folder else None
+        self.conflict = conflict
+        self.stat_key = stat_key
+
+    @property
+    def source(self):
+        return f"{self.source_folder}/{self.file_name}"
+
+    @property
+    def destination(self):
+        return f"{self.destination_folder}/{self.file_name}" if self.destination_folder else ''
+
+class ErrorRecord:
+    # A song that could not be organized, listed in the music error window
+    __slots__ = ('folder', 'file_name', 'artist_found', 'album_found', 'metadata_dict', 'error')
+
+    def __init__(self, path_in_str, error, artist_found='', album_found='', metadata_dict=None):
+        self.folder, self.file_name = split_song_path(path_in_str)
+        self.artist_found = artist_found
+        self.album_found = album_found
+        self.metadata_dict = metadata_dict if metadata_dict is not None else {}
+        self.error = error
+
+    @property
+    def path_in_str(self):
+        return f"{self.folder}/{self.file_name}"
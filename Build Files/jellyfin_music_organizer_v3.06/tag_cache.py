@@ -0,0 +1,110 @@
+import sqlite3
+import json
+import os
+
+class TagCache:
+    # Bumped when the cached tags change shape, older tags are then read again
+    tags_version = 2
+
+    def __init__(self, cache_path='tag_cache_jmo.db'):
+        self.cache_path = cache_path
+
+        # Cache statistics for the run summary
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        # Number of writes waiting to be committed
+        self.pending_writes = 0
+
+        # Tags are stored as JSON text keyed by source path, with the size and mtime they were read at
+        self.connection = sqlite3.connect(self.cache_path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS tags (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                tags TEXT NOT NULL
+            )
+        """)
+
+        # File hashes used to spot identical songs are stored the same way, one row per hash kind
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT NOT NULL,
+                hash_kind TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY (path, hash_kind)
+            )
+        """)
+
+        # Tags cached before version 1 kept binary values (cover art) as text, and before version 2 the header
+        # reader's WMA and long tag text didn't match mutagen's, drop them so they are read again
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] < self.tags_version:
+            self.connection.execute("DELETE FROM tags")
+            self.connection.execute(f"PRAGMA user_version = {self.tags_version}")
+        self.connection.commit()
+
+    def get(self, path_in_str, size, mtime_ns):
+        row = self.connection.execute("SELECT size, mtime_ns, tags FROM tags WHERE path = ?", (path_in_str,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        # A changed size or mtime means the file was edited since its tags were cached
+        if row[0] != size or row[1] != mtime_ns:
+            self.invalidations += 1
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return json.loads(row[2])
+
+    def put(self, path_in_str, size, mtime_ns, tags):
+        self.connection.execute("INSERT OR REPLACE INTO tags (path, size, mtime_ns, tags) VALUES (?, ?, ?, ?)",
+                                (path_in_str, size, mtime_ns, json.dumps(tags)))
+
+        # Commit in batches so a large run does not sync the database once per song
+        self.pending_writes += 1
+        if self.pending_writes >= 500:
+            self.commit()
+
+    def get_hash(self, path_in_str, size, mtime_ns, hash_kind):
+        row = self.connection.execute("SELECT size, mtime_ns, hash FROM file_hashes WHERE path = ? AND hash_kind = ?", (path_in_str, hash_kind)).fetchone()
+        if row is None or row[0] != size or row[1] != mtime_ns:
+            return None
+        return row[2]
+
+    def put_hash(self, path_in_str, size, mtime_ns, hash_kind, file_hash):
+        self.connection.execute("INSERT OR REPLACE INTO file_hashes (path, hash_kind, size, mtime_ns, hash) VALUES (?, ?, ?, ?, ?)",
+                                (path_in_str, hash_kind, size, mtime_ns, file_hash))
+
+        # Commit in batches so a large run does not sync the database once per song
+        self.pending_writes += 1
+        if self.pending_writes >= 500:
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self.pending_writes = 0
+
+    def clear(self):
+        self.connection.execute("DELETE FROM tags")
+        self.connection.execute("DELETE FROM file_hashes")
+        self.commit()
+        self.connection.execute("VACUUM")
+
+    def compact(self):
+        # Remove entries for files that no longer exist, then shrink the database file
+        stale_paths = [(path_in_str,) for (path_in_str,) in self.connection.execute("SELECT path FROM tags UNION SELECT path FROM file_hashes") if not os.path.exists(path_in_str)]
+        self.connection.executemany("DELETE FROM tags WHERE path = ?", stale_paths)
+        self.connection.executemany("DELETE FROM file_hashes WHERE path = ?", stale_paths)
+        self.commit()
+        self.connection.execute("VACUUM")
+        return len(stale_paths)
+
+    def close(self):
+        self.commit()
+        self.connection.close()
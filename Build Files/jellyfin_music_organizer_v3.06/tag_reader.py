@@ -0,0 +1,175 @@
+import mutagen
+from mutagen.aiff import AIFF
+from mutagen.asf import ASF
+from mutagen.flac import FLAC
+from mutagen.monkeysaudio import MonkeysAudio
+from mutagen.mp3 import MP3
+from mutagen.mp4 import MP4
+from mutagen.musepack import Musepack
+from mutagen.oggopus import OggOpus
+from mutagen.oggvorbis import OggVorbis
+from mutagen.wave import WAVE
+
+from header_tag_reader import read_header_tags
+
+# Define the artist and album values to search for
+artist_values = ['©art', 'artist', 'author', 'tpe1']
+album_values = ['©alb', 'album', 'talb', 'wm/albumtitle']
+
+# mutagen class for each extension OrganizeThread scans for, so mutagen.File doesn't have to score every format
+music_file_types = {
+    '.aif': AIFF,
+    '.aiff': AIFF,
+    '.ape': MonkeysAudio,
+    '.flac': FLAC,
+    '.m4a': MP4,
+    '.m4b': MP4,
+    '.m4r': MP4,
+    '.mp2': MP3,
+    '.mp3': MP3,
+    '.mp4': MP4,
+    '.mpc': Musepack,
+    '.ogg': OggVorbis,
+    '.opus': OggOpus,
+    '.wav': WAVE,
+    '.wma': ASF
+}
+
+# Vorbis comments that hold a base64 encoded picture
+picture_comment_keys = ['metadata_block_picture', 'coverart']
+
+# Longest tag value kept as text for a song, MusicErrorWindow reads the song again to show whole values
+max_tag_text_length = 1000
+
+# The only error that depends on the song alone, every other one may be a passing read failure
+missing_tags_error = "Artist or album data not found"
+
+def binary_placeholder(value):
+    # Type and size of a binary tag value (APIC, covr, WM/Picture, APE binary items), or None for text
+    if getattr(value, 'dataformat', None) == 1:
+        # MP4 freeform atoms are bytes even when they hold UTF-8 text
+        return None
+    for data in (getattr(value, 'data', None), getattr(value, 'value', None), value):
+        if isinstance(data, bytes):
+            return f"[{getattr(value, 'mime', '') or type(value).__name__}, {len(data)} bytes]"
+    return None
+
+def tag_value_text(key, value, max_length=max_tag_text_length):
+    # A tag value as text the way mutagen shows it, with binary values replaced by a placeholder so no
+    # cover art is kept in memory (or pickled, or cached) with the song's tags
+    items = value if isinstance(value, list) else [value]
+    if str(key).lower() in picture_comment_keys:
+        placeholders = [f"[base64 picture, {len(str(item))} characters]" for item in items]
+    else:
+        placeholders = [binary_placeholder(item) for item in items]
+
+    if not any(placeholders):
+        text = str(value)
+    elif isinstance(value, list):
+        text = str([placeholder or item for placeholder, item in zip(placeholders, items)])
+    else:
+        text = placeholders[0]
+
+    return shorten_tag_text(text, max_length)
+
+def shorten_tag_text(text, max_length=max_tag_text_length):
+    if max_length and len(text) > max_length:
+        text = f"{text[:max_length]}... ({len(text)} characters)"
+    return text
+
+def blank_music_tags(error=''):
+    # Compact tag fields the organizer needs for one song
+    return {
+        'artist': '',
+        'album': '',
+        'artist_found': '',
+        'album_found': '',
+        'metadata_dict': {},
+        'error': error
+    }
+
+def open_music_file(path_in_str):
+    # Parse with the class the extension names, and only probe every format when the song isn't what its extension says
+    music_file_type = music_file_types.get(path_in_str[path_in_str.rfind('.'):].lower())
+    if music_file_type is not None:
+        try:
+            return music_file_type(path_in_str)
+        except Exception:
+            pass
+    return mutagen.File(path_in_str)
+
+def read_music_header_tags(path_in_str):
+    # Artist and album from the tag blocks at the start of the song, or None when mutagen has to read it
+    header_tags = read_header_tags(path_in_str, set(artist_values + album_values))
+    if header_tags is None:
+        return None
+
+    # mutagen decides between several artist or album keys (and reports missing ones) as before
+    artist_keys = [key for key in header_tags if key.lower() in artist_values]
+    album_keys = [key for key in header_tags if key.lower() in album_values]
+    if len(artist_keys) != 1 or len(album_keys) != 1:
+        return None
+
+    # Only the artist and album entries are known, the rest of the song's tags were never read
+    tags = blank_music_tags()
+    for key, (values, text) in header_tags.items():
+        tags['metadata_dict'][key] = shorten_tag_text(text)
+    tags['artist_found'] = header_tags[artist_keys[0]][0]
+    tags['album_found'] = header_tags[album_keys[0]][0]
+    tags['artist'] = tags['artist_found'][0]
+    tags['album'] = tags['album_found'][0]
+    return tags
+
+def read_music_tags(path_in_str):
+    # Most songs are resolved without mutagen parsing every frame (and the cover art)
+    tags = read_music_header_tags(path_in_str)
+    if tags is not None:
+        return tags
+
+    # Reset variables
+    artist_data = ''
+    album_data = ''
+    tags = blank_music_tags()
+    metadata_dict = tags['metadata_dict']
+
+    try:
+        # Load and extract metadata from the music file
+        metadata = open_music_file(path_in_str)
+
+        # Iterate over the metadata items and add them to the dictionary as text, so no mutagen objects are kept or pickled
+        for key, value in metadata.items():
+            metadata_dict[str(key)] = tag_value_text(key, value)
+
+        # Loop through the metadata to find matching artist and album values
+        for key, value in metadata.items():
+            lowercase_key = key.lower()
+            if lowercase_key in artist_values:
+                artist_data = value
+            elif lowercase_key in album_values:
+                album_data = value
+
+        # Keep the found values as plain strings (ASFUnicodeAttribute and ID3 frames are converted here)
+        tags['artist_found'] = [str(value) for value in artist_data] if artist_data != '' else ''
+        tags['album_found'] = [str(value) for value in album_data] if album_data != '' else ''
+
+        # Check if artist_data and album_data were found
+        if artist_data == '' or album_data == '':
+            raise Exception(missing_tags_error)
+
+        # Use the first artist and album value
+        tags['artist'] = tags['artist_found'][0]
+        tags['album'] = tags['album_found'][0]
+
+    except Exception as e:
+        tags['error'] = str(e)
+
+    return tags
+
+def read_full_metadata(path_in_str):
+    # Every tag of a song with whole text values, read again from disk when an error entry is opened
+    metadata = open_music_file(path_in_str)
+    return {str(key): tag_value_text(key, value, max_length=None) for key, value in metadata.items()}
+
+def read_music_tags_batch(paths):
+    # Read a shard of songs in one call so a worker process is only sent one task per shard
+    return [read_music_tags(path_in_str) for path_in_str in paths]
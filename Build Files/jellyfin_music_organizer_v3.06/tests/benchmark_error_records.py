@@ -0,0 +1,76 @@
+# Memory kept by the error records of untagged songs with cover art, with tag text as str(value) (before
+# tag_value_text) and as read_music_tags builds it now.
+# Run it directly: python tests/benchmark_error_records.py [songs] [cover art KB]
+import base64
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mutagen.flac import Picture
+from mutagen.id3 import ID3, TIT2, APIC
+from mutagen.mp4 import MP4, MP4Cover
+
+import tag_reader
+from song_files import make_mp3, make_mp4, make_vorbis
+from song_records import ErrorRecord
+
+def write_songs(folder_path, song_count, art_size):
+    # A third each of MP3 (APIC frame), M4A (covr atom) and Ogg (base64 picture comment), none with artist or album
+    picture = Picture()
+    picture.type, picture.mime, picture.data = 3, 'image/jpeg', os.urandom(art_size)
+    picture_comment = 'METADATA_BLOCK_PICTURE=' + base64.b64encode(picture.write()).decode('ascii')
+    for i in range(song_count):
+        if i % 3 == 0:
+            make_mp3(f"{folder_path}/{i}.mp3")
+            id3 = ID3()
+            id3.add(TIT2(encoding=3, text=[f"Title {i}"]))
+            id3.add(APIC(encoding=3, mime='image/jpeg', type=3, desc='', data=os.urandom(art_size)))
+            id3.save(f"{folder_path}/{i}.mp3")
+        elif i % 3 == 1:
+            make_mp4(f"{folder_path}/{i}.m4a", 4000)
+            mp4 = MP4(f"{folder_path}/{i}.m4a")
+            mp4['\xa9nam'] = [f"Title {i}"]
+            mp4['covr'] = [MP4Cover(os.urandom(art_size))]
+            mp4.save()
+        else:
+            make_vorbis(f"{folder_path}/{i}.ogg", [f"TITLE=Title {i}", picture_comment])
+
+def str_value_tags(path_in_str):
+    # metadata_dict as read_music_tags built it before binary values were replaced by placeholders
+    tags = tag_reader.blank_music_tags(tag_reader.missing_tags_error)
+    tags['metadata_dict'] = {str(key): str(value) for key, value in tag_reader.open_music_file(path_in_str).items()}
+    return tags
+
+def measure(name, paths, read_tags):
+    gc.collect()
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    error_files = []
+    for path_in_str in paths:
+        tags = read_tags(path_in_str)
+        error_files.append(ErrorRecord(path_in_str, tags['error'], tags['artist_found'], tags['album_found'], tags['metadata_dict']))
+    elapsed = time.perf_counter() - start_time
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:16s}: {retained / 1024 / 1024:8.1f} MB retained ({retained / len(paths) / 1024:7.1f} KB per record), "
+          f"peak {peak / 1024 / 1024:8.1f} MB, {elapsed:.1f} s")
+
+def main():
+    song_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    art_size = (int(sys.argv[2]) if len(sys.argv) > 2 else 500) * 1024
+
+    with tempfile.TemporaryDirectory() as folder_path:
+        write_songs(folder_path, song_count, art_size)
+        paths = sorted(f"{folder_path}/{name}" for name in os.listdir(folder_path))
+        print(f"{song_count} untagged songs with {art_size // 1024} KB of cover art")
+        measure('str(value)', paths, str_value_tags)
+        measure('read_music_tags', paths, tag_reader.read_music_tags)
+
+if __name__ == '__main__':
+    main()
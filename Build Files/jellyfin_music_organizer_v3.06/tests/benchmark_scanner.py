@@ -0,0 +1,63 @@
+# Wall time and directory listings of the old Path.glob loop and scan_music_files on a synthetic music folder.
+# Run it directly: python tests/benchmark_scanner.py [artists] [albums per artist] [files per album]
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from music_scanner import scan_music_files
+
+# The extensions OrganizeThread.run looks for
+extensions = [".aif", ".aiff", ".ape", ".flac", ".m4a", ".m4b", ".m4r", ".mp2", ".mp3", ".mp4", ".mpc", ".ogg", ".opus", ".wav", ".wma"]
+
+# Every os.scandir call is one directory opened and listed (getdents), counted with an audit hook
+directory_listings = 0
+
+def count_directory_listings(event, args):
+    global directory_listings
+    if event in ('os.scandir', 'os.listdir'):
+        directory_listings += 1
+
+def write_tree(root_folder_path, artists, albums, files):
+    # Songs mixed with cover art and text files, and some upper-case extensions the glob loop never found
+    random_names = random.Random(1)
+    for artist in range(artists):
+        for album in range(albums):
+            album_folder = f"{root_folder_path}/artist{artist}/album{album}"
+            os.makedirs(album_folder)
+            for track in range(files):
+                extension = random_names.choice(extensions + ['.jpg', '.txt', '.MP3', '.Flac'])
+                open(f"{album_folder}/track{track}{extension}", 'w').close()
+
+def glob_loop(root_folder_path):
+    # How OrganizeThread.run listed songs before music_scanner: one recursive glob per extension
+    path_list = []
+    for extension in extensions:
+        path_list.extend(Path(root_folder_path).glob(f"**/*{extension}"))
+    return path_list
+
+def measure(name, scan):
+    global directory_listings
+    directory_listings = 0
+    start_time = time.perf_counter()
+    songs = scan()
+    elapsed = time.perf_counter() - start_time
+    print(f"{name:16s}: {elapsed * 1000:7.0f} ms, {directory_listings:6d} directory listings, {len(songs)} songs")
+
+def main():
+    tree_size = [int(argument) for argument in sys.argv[1:4]]
+    artists, albums, files = tree_size + [200, 10, 12][len(tree_size):]
+    sys.addaudithook(count_directory_listings)
+
+    with tempfile.TemporaryDirectory() as root_folder_path:
+        write_tree(root_folder_path, artists, albums, files)
+        print(f"{artists} artists x {albums} albums x {files} files")
+        measure('glob loop', lambda: glob_loop(root_folder_path))
+        measure('scan_music_files', lambda: list(scan_music_files(root_folder_path, extensions)))
+
+if __name__ == '__main__':
+    main()
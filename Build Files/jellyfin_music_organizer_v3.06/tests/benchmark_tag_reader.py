@@ -0,0 +1,84 @@
+# Throughput of read_music_tags with and without the header readers, on songs with growing cover art.
+# Run it directly: python tests/benchmark_tag_reader.py [songs per format]
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mutagen.flac import FLAC, Picture
+from mutagen.id3 import ID3, TPE1, TALB, APIC
+from mutagen.mp4 import MP4, MP4Cover
+
+import tag_reader
+from song_files import make_flac, make_mp3, make_mp4, make_vorbis
+
+def write_songs(folder_path, song_count, art_size):
+    for i in range(song_count):
+        artist, album = f"Artist {i}", f"Album {i}"
+
+        make_mp3(f"{folder_path}/{i}.mp3", 4000)
+        id3 = ID3()
+        id3.add(TPE1(encoding=3, text=[artist]))
+        id3.add(TALB(encoding=3, text=[album]))
+        if art_size:
+            id3.add(APIC(encoding=3, mime='image/jpeg', type=3, desc='', data=b'\xff' * art_size))
+        id3.save(f"{folder_path}/{i}.mp3")
+
+        make_flac(f"{folder_path}/{i}.flac", audio_size=4000)
+        flac = FLAC(f"{folder_path}/{i}.flac")
+        flac['ARTIST'], flac['ALBUM'] = artist, album
+        if art_size:
+            picture = Picture()
+            picture.type, picture.mime, picture.data = 3, 'image/jpeg', b'\xff' * art_size
+            flac.add_picture(picture)
+        flac.save()
+
+        make_mp4(f"{folder_path}/{i}.m4a", 4000)
+        mp4 = MP4(f"{folder_path}/{i}.m4a")
+        mp4['\xa9ART'], mp4['\xa9alb'] = [artist], [album]
+        if art_size:
+            mp4['covr'] = [MP4Cover(b'\xff' * art_size)]
+        mp4.save()
+
+        # Ogg cover art is a base64 comment, the whole comment packet is read either way
+        if not art_size:
+            make_vorbis(f"{folder_path}/{i}.ogg", [f"ARTIST={artist}", f"ALBUM={album}"])
+
+def songs_per_second(paths, repeats=3):
+    # Best of a few passes, the songs are in the page cache after the first one
+    best_seconds = None
+    for repeat in range(repeats):
+        start_time = time.perf_counter()
+        results = [tag_reader.read_music_tags(path) for path in paths]
+        elapsed = time.perf_counter() - start_time
+        best_seconds = elapsed if best_seconds is None else min(best_seconds, elapsed)
+    return len(paths) / best_seconds, [(tags['artist'], tags['album']) for tags in results]
+
+def main():
+    song_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    header_reader = tag_reader.read_music_header_tags
+
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        for art_size in (0, 100 * 1024, 2 * 1024 * 1024):
+            folder_path = f"{temporary_folder}/{art_size}"
+            os.makedirs(folder_path)
+            write_songs(folder_path, song_count, art_size)
+
+            for extension in ('.mp3', '.flac', '.m4a', '.ogg'):
+                paths = [f"{folder_path}/{i}{extension}" for i in range(song_count)]
+                if not os.path.exists(paths[0]):
+                    continue
+
+                tag_reader.read_music_header_tags = lambda path_in_str: None
+                mutagen_rate, mutagen_results = songs_per_second(paths)
+                tag_reader.read_music_header_tags = header_reader
+                header_rate, header_results = songs_per_second(paths)
+
+                assert header_results == mutagen_results
+                print(f"art {art_size // 1024:5d} KB {extension:5s}: mutagen {mutagen_rate:7.0f} songs/s, "
+                      f"header reader {header_rate:7.0f} songs/s, {header_rate / mutagen_rate:.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The application modules are imported by name from the folder above, the same way main.py imports them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
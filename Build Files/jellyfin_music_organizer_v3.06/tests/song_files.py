@@ -0,0 +1,89 @@
+import os
+import struct
+import uuid
+
+from mutagen.ogg import OggPage
+
+# Smallest audio skeletons mutagen accepts, the tags themselves are written by mutagen
+
+def flac_block(block_type, body, last=False):
+    return bytes([block_type | (0x80 if last else 0)]) + len(body).to_bytes(3, 'big') + body
+
+def flac_streaminfo():
+    # 4096 sample blocks, 44100 Hz, 2 channels, 16 bits per sample, no samples and a zero MD5
+    sample_info = (44100 << 44) | (1 << 41) | (15 << 36)
+    return struct.pack('>HH', 4096, 4096) + b'\x00' * 6 + sample_info.to_bytes(8, 'big') + b'\x00' * 16
+
+def make_flac(path, blocks=(), audio_size=0):
+    # STREAMINFO, then the given blocks (already built, e.g. comments before or after a picture), then one frame
+    all_blocks = [flac_block(0, flac_streaminfo())] + list(blocks) + [flac_block(1, b'\x00' * 1024, last=True)]
+    with open(path, 'wb') as f:
+        f.write(b'fLaC' + b''.join(all_blocks) + b'\xff\xf8' + os.urandom(audio_size) + b'\x00\x00')
+
+def make_mp3(path, audio_size=0):
+    # MPEG-1 layer III frames at 128 kbit/s, 44100 Hz
+    frame = b'\xff\xfb\x90\x64' + b'\x00' * 413
+    with open(path, 'wb') as f:
+        f.write(frame * max(3, audio_size // len(frame)))
+
+def vorbis_comment(comments, vendor=b'jmo'):
+    # Comments are str, or bytes to write malformed ones
+    body = struct.pack('<I', len(vendor)) + vendor + struct.pack('<I', len(comments))
+    for comment in comments:
+        comment = comment.encode('utf-8') if isinstance(comment, str) else comment
+        body += struct.pack('<I', len(comment)) + comment
+    return body
+
+def write_ogg(path, id_packet, comment_packet, extra_packets=(), serial=1234):
+    first_page = OggPage()
+    first_page.serial, first_page.sequence, first_page.first, first_page.packets, first_page.position = serial, 0, True, [id_packet], 0
+    pages = [first_page]
+
+    # The comment packet may span several pages, the next packet starts a new page as the specification asks
+    for page in OggPage.from_packets([comment_packet] + list(extra_packets), sequence=1):
+        page.serial, page.position = serial, 0
+        pages.append(page)
+
+    last_page = OggPage()
+    last_page.serial, last_page.sequence, last_page.packets, last_page.position, last_page.last = serial, len(pages), [b'\x00' * 100], 44100, True
+    pages.append(last_page)
+    with open(path, 'wb') as f:
+        for page in pages:
+            f.write(page.write())
+
+def make_vorbis(path, comments, framing=True):
+    identification = b'\x01vorbis' + struct.pack('<IBIiiiBB', 0, 2, 44100, 0, 128000, 0, 0xB8, 1)
+    comment_packet = b'\x03vorbis' + vorbis_comment(comments) + (b'\x01' if framing else b'')
+    write_ogg(path, identification, comment_packet, [b'\x05vorbis' + b'\x00' * 50])
+
+def make_opus(path, comments):
+    identification = b'OpusHead' + struct.pack('<BBHIhB', 1, 2, 312, 48000, 0, 0)
+    write_ogg(path, identification, b'OpusTags' + vorbis_comment(comments))
+
+def atom(name, payload):
+    return struct.pack('>I4s', 8 + len(payload), name) + payload
+
+def mp4_movie():
+    movie_header = atom(b'mvhd', b'\x00' * 4 + struct.pack('>IIII', 0, 0, 1000, 5000) + b'\x00' * 80)
+    media_header = atom(b'mdhd', b'\x00' * 4 + struct.pack('>IIII', 0, 0, 44100, 44100 * 5) + b'\x00' * 4)
+    handler = atom(b'hdlr', b'\x00' * 8 + b'soun' + b'\x00' * 13)
+    return atom(b'moov', movie_header + atom(b'trak', atom(b'mdia', media_header + handler)))
+
+def make_mp4(path, audio_size=1000, media_data_first=False):
+    file_type = atom(b'ftyp', b'M4A \x00\x00\x00\x00M4A mp42isom')
+    media_data = atom(b'mdat', b'\x00' * audio_size)
+    with open(path, 'wb') as f:
+        f.write(file_type + (media_data + mp4_movie() if media_data_first else mp4_movie() + media_data))
+
+def asf_guid(text):
+    return uuid.UUID(text).bytes_le
+
+def make_asf(path):
+    # Header object holding only the file properties object, then an empty data object
+    file_properties_body = b'\x00' * 16 + struct.pack('<QQQQQQIIII', 0, 0, 1, 50000000, 50000000, 0, 2, 1000, 1000, 128000)
+    file_properties = asf_guid('8CABDCA1-A947-11CF-8EE4-00C00C205365') + struct.pack('<Q', 24 + len(file_properties_body)) + file_properties_body
+    header_body = struct.pack('<IBB', 1, 1, 2) + file_properties
+    header = asf_guid('75B22630-668E-11CF-A6D9-00AA0062CE6C') + struct.pack('<Q', 24 + len(header_body)) + header_body
+    data = asf_guid('75B22636-668E-11CF-A6D9-00AA0062CE6C') + struct.pack('<Q', 50) + b'\x00' * 26
+    with open(path, 'wb') as f:
+        f.write(header + data)
@@ -0,0 +1,19 @@
+from destination_index import DestinationIndex
+
+def test_existing_names_match_without_case(tmp_path):
+    album_folder = tmp_path / 'Artist' / 'Album'
+    album_folder.mkdir(parents=True)
+    (album_folder / 'Song.mp3').write_bytes(b'')
+
+    destination_index = DestinationIndex()
+    # A case-insensitive drive would rename song.mp3 over Song.mp3, so it must be a conflict on every platform
+    assert destination_index.contains(str(album_folder), 'song.mp3')
+    assert destination_index.contains(str(tmp_path / 'artist' / 'album'), 'SONG.MP3')
+    assert not destination_index.contains(str(album_folder), 'Other.mp3')
+
+def test_songs_of_one_run_claim_names_without_case(tmp_path):
+    destination_index = DestinationIndex()
+    album_folder = str(tmp_path / 'Artist' / 'Album')
+    destination_index.add(album_folder, 'Song.mp3')
+    assert destination_index.contains(album_folder, 'song.mp3')
+    assert destination_index.folders_listed == 1
@@ -0,0 +1,192 @@
+import itertools
+import os
+
+import pytest
+from mutagen.asf import ASF, ASFUnicodeAttribute, ASFDWordAttribute, ASFByteArrayAttribute
+from mutagen.flac import Picture
+from mutagen.id3 import ID3, TPE1, TALB, TPE2, TIT2, TXXX, APIC
+from mutagen.mp4 import MP4, MP4Cover
+
+import tag_reader
+from song_files import flac_block, make_flac, make_mp3, vorbis_comment, make_vorbis, make_opus, make_mp4, make_asf
+
+# Keys of read_music_tags that decide the folder a song goes to, or the error it is listed with
+compared_keys = ('artist', 'album', 'artist_found', 'album_found', 'error')
+
+# Each case is (test id, extension, function writing the song to the path it is given)
+song_cases = []
+
+def song_case(case_id, extension):
+    def add_case(write_song):
+        song_cases.append(pytest.param(extension, write_song, id=case_id))
+        return write_song
+    return add_case
+
+# MP3: every ID3v2 version and text encoding, with and without cover art, missing and empty tags
+text_sets = {'plain': ['Artist'], 'multi': ['Émile', 'Zoë'], 'cjk': ['日本語'], 'slash': ['AC/DC'], 'empty': ['']}
+id3_tag_pairs = [('plain', 'plain'), ('multi', 'plain'), ('cjk', 'slash'), ('plain', None), (None, 'plain'), ('empty', 'plain')]
+for version, encoding, art_size, (artist_set, album_set) in itertools.product((3, 4), (0, 1, 2, 3), (0, 300000), id3_tag_pairs):
+    artist, album = text_sets.get(artist_set), text_sets.get(album_set)
+    # Latin-1 can't hold these values, mutagen would refuse to save them
+    if encoding == 0 and any(ord(character) > 255 for value in (artist or []) + (album or []) for character in value):
+        continue
+
+    def write_id3(path, version=version, encoding=encoding, art_size=art_size, artist=artist, album=album):
+        make_mp3(path)
+        id3 = ID3()
+        id3.add(TIT2(encoding=encoding, text=['title']))
+        if art_size:
+            id3.add(APIC(encoding=3, mime='image/jpeg', type=3, desc='', data=os.urandom(art_size)))
+        if artist is not None:
+            id3.add(TPE1(encoding=encoding, text=artist))
+        # Frames whose names contain 'artist' but are not the artist
+        id3.add(TXXX(encoding=encoding, desc='artist', text=['x']))
+        id3.add(TPE2(encoding=encoding, text=['band']))
+        if album is not None:
+            id3.add(TALB(encoding=encoding, text=album))
+        id3.save(path, v2_version=version)
+
+    song_case(f"id3v2.{version}-encoding{encoding}-art{art_size}-{artist_set}-{album_set}", '.mp3')(write_id3)
+
+@song_case('mp3-untagged', '.mp3')
+def write_untagged_mp3(path):
+    make_mp3(path)
+
+@song_case('mp3-empty-id3', '.mp3')
+def write_empty_id3(path):
+    make_mp3(path)
+    ID3().save(path)
+
+@song_case('mp3-id3v1-too', '.mp3')
+def write_id3v1_too(path):
+    make_mp3(path)
+    id3 = ID3()
+    id3.add(TPE1(encoding=3, text=['A']))
+    id3.add(TALB(encoding=3, text=['B']))
+    id3.save(path, v1=2)
+
+# Vorbis comments: duplicates, conflicting artist keys, missing tags, invalid UTF-8 and malformed comments
+comment_sets = {
+    'plain': ['ARTIST=A', 'ALBUM=B'],
+    'duplicate-keys': ['artist=A', 'Album=B', 'ARTIST=C'],
+    'two-artist-keys': ['ARTIST=A', 'AUTHOR=D', 'ALBUM=B'],
+    'no-artist': ['ALBUM=B'],
+    'none': [],
+    'non-ascii': ['ARTIST=Émile', 'ALBUM=日本語', 'TITLE=t'],
+    'invalid-utf8-value': [b'ARTIST=\xff\xfeA', 'ALBUM=B'],
+    'no-equals': ['ARTIST', 'ARTIST=A', 'ALBUM=B'],
+    'empty-value': ['ARTIST=', 'ALBUM=B'],
+    'equals-in-value': ['ARTIST=A=B', 'ALBUM=x'],
+    'invalid-utf8-key': [b'ART\xc3\xa9IST=A', 'ALBUM=B'],
+}
+for (comments_id, comments), art_size, art_first in itertools.product(comment_sets.items(), (0, 300000), (False, True)):
+    def write_flac(path, comments=comments, art_size=art_size, art_first=art_first):
+        blocks = [flac_block(4, vorbis_comment(comments))]
+        if art_size:
+            picture = Picture()
+            picture.type, picture.mime, picture.data = 3, 'image/jpeg', os.urandom(art_size)
+            blocks.insert(0 if art_first else 1, flac_block(6, picture.write()))
+        make_flac(path, blocks)
+
+    song_case(f"flac-{comments_id}-art{art_size}{'-art-first' if art_first else ''}", '.flac')(write_flac)
+
+# A cover art comment makes the comment packet span several Ogg pages
+ogg_comment_sets = dict(comment_sets, **{'picture-spans-pages': ['ARTIST=A', 'ALBUM=B', 'METADATA_BLOCK_PICTURE=' + 'x' * 200000]})
+for comments_id, comments in ogg_comment_sets.items():
+    song_case(f"vorbis-{comments_id}", '.ogg')(lambda path, comments=comments: make_vorbis(path, comments))
+    song_case(f"opus-{comments_id}", '.opus')(lambda path, comments=comments: make_opus(path, comments))
+song_case('vorbis-no-framing-bit', '.ogg')(lambda path: make_vorbis(path, ['ARTIST=A', 'ALBUM=B'], framing=False))
+
+# MP4: multi-value and missing tags, cover art, large media data
+for artist, album, large_media_data, cover_size in itertools.product((['A'], ['Émile', 'Zoë'], None), (['B'], None), (False, True), (0, 300000)):
+    def write_mp4(path, artist=artist, album=album, large_media_data=large_media_data, cover_size=cover_size):
+        make_mp4(path, 200000 if large_media_data else 100)
+        mp4 = MP4(path)
+        if artist:
+            mp4['\xa9ART'] = artist
+        if album:
+            mp4['\xa9alb'] = album
+        mp4['aART'] = ['band']
+        if cover_size:
+            mp4['covr'] = [MP4Cover(os.urandom(cover_size))]
+        mp4.save()
+
+    song_case(f"mp4-{'-'.join(artist or ['no-artist'])}-{'-'.join(album or ['no-album'])}-mdat{200000 if large_media_data else 100}-art{cover_size}", '.m4a')(write_mp4)
+
+@song_case('mp4-mdat-before-moov', '.m4b')
+def write_mp4_media_data_first(path):
+    make_mp4(path, 5000, media_data_first=True)
+    mp4 = MP4(path)
+    mp4['\xa9ART'] = ['A']
+    mp4['\xa9alb'] = ['B']
+    mp4.save()
+
+# ASF: several values, language tagged and non-text values, cover art, long values, missing and conflicting keys
+asf_tag_sets = {
+    'plain': {'Author': ['A'], 'WM/AlbumTitle': ['B']},
+    'two-authors': {'Author': ['A', 'C'], 'WM/AlbumTitle': ['B'], 'Title': ['t']},
+    'language': {'Author': ['Émile'], 'WM/AlbumTitle': [ASFUnicodeAttribute('B', language=1)]},
+    'dword-album': {'Author': ['A'], 'WM/AlbumTitle': [ASFDWordAttribute(5)]},
+    'picture': {'Author': ['A'], 'WM/AlbumTitle': ['B'], 'WM/Picture': [ASFByteArrayAttribute(os.urandom(300000))]},
+    'long-album': {'Author': ['A'], 'WM/AlbumTitle': ['x' * 40000]},
+    'no-author': {'WM/AlbumTitle': ['B']},
+    'two-artist-keys': {'Author': ['A'], 'artist': ['Z'], 'WM/AlbumTitle': ['B']},
+}
+for tags_id, asf_tags in asf_tag_sets.items():
+    def write_asf(path, asf_tags=asf_tags):
+        make_asf(path)
+        asf = ASF(path)
+        for key, values in asf_tags.items():
+            asf[key] = values
+        asf.save()
+
+    song_case(f"asf-{tags_id}", '.wma')(write_asf)
+
+def read_with_mutagen(monkeypatch, path):
+    # The tags read_music_tags gave before the header readers existed
+    with monkeypatch.context() as patch:
+        patch.setattr(tag_reader, 'read_music_header_tags', lambda path_in_str: None)
+        return tag_reader.read_music_tags(path)
+
+@pytest.mark.parametrize('extension, write_song', song_cases)
+def test_header_reader_matches_mutagen(tmp_path, monkeypatch, extension, write_song):
+    path = str(tmp_path / f"song{extension}")
+    write_song(path)
+
+    tags = tag_reader.read_music_tags(path)
+    expected = read_with_mutagen(monkeypatch, path)
+    assert {key: tags[key] for key in compared_keys} == {key: expected[key] for key in compared_keys}
+
+    # The header path only knows the artist and album entries, their text must be what mutagen shows
+    header_tags = tag_reader.read_music_header_tags(path)
+    if header_tags is not None:
+        assert header_tags['metadata_dict'] == {key: expected['metadata_dict'][key] for key in header_tags['metadata_dict']}
+
+song_cases_by_id = {case.id: case for case in song_cases}
+
+def cases(*case_ids):
+    return [song_cases_by_id[case_id] for case_id in case_ids]
+
+@pytest.mark.parametrize('extension, write_song', cases(
+    'id3v2.4-encoding3-art300000-plain-plain', 'flac-plain-art300000-art-first', 'vorbis-plain', 'opus-plain', 'mp4-A-B-mdat200000-art300000', 'asf-picture'))
+def test_common_songs_take_the_header_path(tmp_path, extension, write_song):
+    path = str(tmp_path / f"song{extension}")
+    write_song(path)
+    assert tag_reader.read_music_header_tags(path) is not None
+
+@pytest.mark.parametrize('extension, write_song', cases(
+    'id3v2.3-encoding1-art300000-plain-plain', 'flac-plain-art300000-art-first', 'vorbis-picture-spans-pages', 'mp4-A-B-mdat100-art300000', 'asf-picture'))
+def test_truncated_songs_never_read_partial_tags(tmp_path, extension, write_song):
+    path = str(tmp_path / f"song{extension}")
+    write_song(path)
+    full_tags = tag_reader.read_music_header_tags(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    # Cut the song at many points, the header path either reads the whole tags or leaves the song to mutagen
+    truncated_path = str(tmp_path / f"truncated{extension}")
+    for cut in range(1, len(data), max(1, len(data) // 200)):
+        with open(truncated_path, 'wb') as f:
+            f.write(data[:cut])
+        header_tags = tag_reader.read_music_header_tags(truncated_path)
+        assert header_tags is None or header_tags == full_tags, cut